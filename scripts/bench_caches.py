@@ -0,0 +1,146 @@
+""" Measures the framework's caching and output paths against the implementations they replaced.
+
+    python scripts/bench_caches.py [benchmark ...] [--scale N]
+
+Runs every benchmark if none are named. Nothing here touches a mod or the WARNO install; files are written to a
+temporary folder which is deleted afterwards. """
+import argparse
+import os
+import tempfile
+import tracemalloc
+from time import perf_counter
+from typing import Callable
+
+
+def measure(f: Callable[[], object]) -> tuple[float, int]:
+    """ Returns how many seconds `f` took and the peak memory, in bytes, which Python allocated while it ran.
+    Tracing allocations is slow, so `f` is run once for each. """
+    start = perf_counter()
+    f()
+    elapsed = perf_counter() - start
+    tracemalloc.start()
+    f()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (elapsed, peak)
+
+def report(name: str, elapsed: float, peak: int | None = None, extra: str = '') -> None:
+    peak_str = '' if peak is None else f'{peak / 2 ** 20:9.1f} MiB peak'
+    print(f'  {name:<40}{elapsed:9.3f}s {peak_str} {extra}')
+
+def synthetic_tree(rows: int):
+    """ A root list shaped like UniteDescriptor.ndf: one exported object per row, each with a few members and a list """
+    from ndf_parse.model import List, ListRow, MemberRow, Object
+    tree = List(is_root=True)
+    for i in range(rows):
+        obj = Object(type='TEntityDescriptor')
+        obj.add(MemberRow(member='DescriptorId', value=f'GUID:{{{i:08x}-0000-4000-8000-000000000000}}'))
+        obj.add(MemberRow(member='ClassNameForDebug', value=f"'Unit_Benchmark_{i}'"))
+        modules = List()
+        for j in range(20):
+            modules.add(ListRow(value=f'$/GFX/Unit/Benchmark/Module_{j}'))
+        obj.add(MemberRow(member='ModulesDescriptors', value=modules))
+        tree.add(ListRow(value=obj, namespace=f'Descriptor_Unit_Benchmark_{i}', visibility='export'))
+    return tree
+
+def bench_ndf_writer(folder: str, scale: int) -> None:
+    """ user-008: ndf_parse's Mod.write_edit, which the framework used to write files with, versus NdfCache's writer.
+    Both stream the tree through printer.format; write_edit writes straight to the file with the default buffer, while
+    NdfCache buffers 1 MiB at a time into a temporary file which only replaces the output if their contents differ. """
+    from ndf_parse import printer
+    from warno_mfw.utils.types.cache.ndf import _write_tree
+    rows = 5 * scale
+    print(f'ndf writer: {rows} rows')
+    tree = synthetic_tree(rows)
+    edit_path, stream_path = os.path.join(folder, 'write_edit.ndf'), os.path.join(folder, 'stream.ndf')
+    def write_edit():
+        with open(edit_path, 'w', encoding='utf-8') as file:
+            printer.format(tree, file)
+    elapsed, peak = measure(write_edit)
+    size = os.path.getsize(edit_path)
+    report('Mod.write_edit', elapsed, peak, f'{size / 2 ** 20 / elapsed:7.1f} MiB/s')
+    def write_stream():
+        if os.path.exists(stream_path):
+            os.remove(stream_path)
+        _write_tree(tree, stream_path)
+    elapsed, peak = measure(write_stream)
+    report('NdfCache.save', elapsed, peak, f'{size / 2 ** 20 / elapsed:7.1f} MiB/s')
+    # the file is already up to date, so this only compares it
+    elapsed, peak = measure(lambda: _write_tree(tree, stream_path))
+    report('NdfCache.save, unchanged', elapsed, peak)
+    with open(edit_path, 'rb') as a, open(stream_path, 'rb') as b:
+        print(f'  output identical: {a.read() == b.read()}')
+
+def synthetic_guids(entries: int) -> dict[str, str]:
+    return {f'Descriptor_Unit_Benchmark_{i}': f'GUID:{{{i:08x}-0000-4000-8000-000000000000}}' for i in range(entries)}
+
+def bench_cache_format(folder: str, scale: int) -> None:
+    """ user-016: the repr/eval cache files FileCache used to write, versus its versioned JSON lines """
+    from warno_mfw.utils.types.cache.file import read_cache_file, write_cache_file
+    entries = 10 * scale
+    print(f'cache format: {entries} entries')
+    data = synthetic_guids(entries)
+    legacy_path, path = os.path.join(folder, 'legacy.cache'), os.path.join(folder, 'guid.cache')
+    def write_legacy():
+        with open(legacy_path, 'w') as file:
+            file.write(repr(data))
+    def read_legacy():
+        with open(legacy_path) as file:
+            eval(file.read())
+    for name, f in [('repr save', write_legacy),
+                    ('repr load (eval)', read_legacy),
+                    ('JSON lines save', lambda: write_cache_file(path, data)),
+                    # the file is already up to date, so this only compares it
+                    ('JSON lines save, unchanged', lambda: write_cache_file(path, data)),
+                    ('JSON lines load', lambda: read_cache_file(path)),
+                    ('repr migration (literal_eval)', lambda: read_cache_file(legacy_path))]:
+        report(name, *measure(f))
+
+def bench_localization(folder: str, scale: int) -> None:
+    """ user-019: registering and looking up localized strings by scanning every cached value, versus FileCache's
+    value index. The scan is quadratic, so it's run on a tenth as many strings. """
+    from warno_mfw.managers.localization import LocalizationManager
+    from warno_mfw.utils.types.cache.base import BaseCache
+    from warno_mfw.utils.types.cache.file import FileCache
+    strings = 5 * scale
+    print(f'localization: {strings} strings')
+    def run(make_cache: Callable[[], BaseCache[str]], count: int) -> Callable[[], None]:
+        def f():
+            cache = make_cache()
+            cache._data = {}
+            manager = LocalizationManager(cache, 'BENCH')
+            tokens = [manager.register(f'Benchmark string {i}') for i in range(count)]
+            for token in tokens:
+                manager.reverse_lookup(token)
+        return f
+    elapsed, _ = measure(run(BaseCache, strings // 10))
+    report(f'linear scan, {strings // 10} strings', elapsed)
+    elapsed, _ = measure(run(lambda: FileCache('localization', folder), strings))
+    report(f'value index, {strings} strings', elapsed)
+
+BENCHMARKS: dict[str, Callable[[str, int], None]] = {
+    'ndf': bench_ndf_writer,
+    'format': bench_cache_format,
+    'localization': bench_localization,
+}
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Benchmarks the framework\'s caches against the implementations they replaced.')
+    parser.add_argument('benchmarks',
+                        nargs='*',
+                        help=f'Which benchmarks to run, out of {", ".join(BENCHMARKS.keys())}. All of them by default.')
+    parser.add_argument('-s', '--scale',
+                        default=10000,
+                        type=int,
+                        help='Scales the size of each benchmark.')
+    return parser
+
+if __name__ == '__main__':
+    parser = make_parser()
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f'Unknown benchmark {name}!')
+    with tempfile.TemporaryDirectory() as folder:
+        for name in args.benchmarks or BENCHMARKS.keys():
+            BENCHMARKS[name](folder, args.scale)
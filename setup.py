@@ -40,4 +40,8 @@ setup(
     # packages
     package_dir={'':'src'},
     packages=find_packages(where='src'),
+    extras_require={
+        # image preprocessing in warno_mfw.utils.ndf.files
+        'images': ['Pillow']
+    },
 )
\ No newline at end of file
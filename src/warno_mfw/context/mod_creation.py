@@ -1,13 +1,17 @@
 from __future__ import annotations
 
-from typing import Any, Self
+import asyncio
+import os
+from typing import Any, Iterable, Self
 
 import warno_mfw.hints.paths.GameData.Generated               as ndf_paths
 import warno_mfw.creators.ammo                                as ca
 import warno_mfw.creators.division                            as cd
 import warno_mfw.creators.unit.basic                          as cub
 import warno_mfw.creators.unit.infantry                       as cui
+import warno_mfw.creators.unit.towed                          as cut
 import warno_mfw.creators.unit.utils.infantry.weapon          as cuuiw
+import warno_mfw.creators.weapon                              as cw
 import warno_mfw.managers.guid                                as mg
 import warno_mfw.managers.localization                        as ml
 import warno_mfw.managers.unit_id                             as mu
@@ -16,37 +20,105 @@ import warno_mfw.metadata.mod                                 as mem
 import warno_mfw.metadata.unit                                as meu
 import warno_mfw.unit_registration.division_unit_registry     as reg
 from warno_mfw.utils.types.cache.ndf import NdfCache
+from warno_mfw.utils.types.cache.snapshot import NdfSnapshotCache
 import warno_mfw.wrappers.unit                                as wu
 from warno_mfw.utils.ndf import ensure
-from warno_mfw.utils.ndf.files import add_image, add_image_literal
+from warno_mfw.utils.ndf.decorators import ndf_paths as decorated_ndf_paths
+from warno_mfw.utils import bat
+from warno_mfw.utils.io import write_if_changed
+from warno_mfw.utils.sync import sync_folder
+from warno_mfw.utils.ndf.files import ImageQueue, ImageSpec, add_image, add_image_literal
+from warno_mfw.utils.types.cache.base import BaseCache
 from warno_mfw.utils.types.cache.file import FileCache
 from warno_mfw.utils.types.message import Message, try_nest
 from ndf_parse import Mod
-from ndf_parse.model import List, Object
+from ndf_parse.model import List, Map, Object
 from ndf_parse.model.abc import CellValue
 
 GUID, LOCALIZATION, UNIT_ID = "guid", "localization", "unit_id"
 CACHES: list[tuple[str, type]] = [(GUID, str), (LOCALIZATION, str), (UNIT_ID, int)]
+# types whose @ndf_path methods determine which files are prefetched by default
+CREATORS: list[type] = [ca.AmmoCreator,
+                        cd.DivisionCreator,
+                        cub.BasicUnitCreator,
+                        cui.InfantryUnitCreator,
+                        cut.TowedUnitCreator,
+                        cw.WeaponCreator,
+                        reg.DivisionUnitRegistry]
+# files edited by the context itself, which are also prefetched by default
+CONTEXT_PATHS: list[str] = [ndf_paths.UserInterface.Textures.DivisionTextures,
+                            ndf_paths.UserInterface.Textures.ButtonTexturesUnites]
 
 class ModCreationContext(object):
     @property
     def prefix(self: Self) -> str:
         return self.metadata.dev_short_name
     
-    def __init__(self: Self, metadata: mem.ModMetadata, root_msg: Message | None):
+    def __init__(self: Self,
+                 metadata: mem.ModMetadata,
+                 root_msg: Message | None,
+                 jobs: int = 1,
+                 prefetch: Iterable[str] | None = None,
+                 memory_budget: int | None = None,
+                 source_path: str | None = None,
+                 generate: bool = False,
+                 emblem_spec: ImageSpec | None = None,
+                 button_texture_spec: ImageSpec | None = None,
+                 cache_type: type[BaseCache] = FileCache,
+                 deterministic: bool = False):
+        """
+        If `jobs` is greater than 1, the ndf files in `prefetch` (by default, every file edited by the types in CREATORS
+        and the files in CONTEXT_PATHS) are parsed in parallel when entering the context, and modified files are written in parallel when saving.
+        Doing so starts worker processes, so the script creating the context must be guarded by `if __name__ == '__main__':`.
+
+        If `memory_budget` is set, ndf files which have only been read are unloaded once their source files add up to more
+        than that many bytes, and reloaded from snapshots when needed again.
+
+        If `source_path` is given, ndf files are read from there instead of the mod folder, which is synced from it once
+        the mod is written. Only files which differ from the source are copied, and files this build wrote are left as
+        they are, so the files it writes are only replaced if their content changed.
+
+        If `generate` is True, GenerateMod.bat is run after the mod is written, while the caches are saved.
+
+        If `emblem_spec` or `button_texture_spec` are given, division emblems or unit button textures are converted to
+        match them before being copied into the mod. This requires Pillow.
+
+        `cache_type` is the class used for the GUID, localization and unit ID caches. SqliteCache commits new entries
+        as they're made rather than only when the context exits successfully.
+
+        If `deterministic` is True, new GUIDs and localization keys are derived from the mod's name and what they're
+        for instead of being random, so builds produce the same ones even without the caches.
+        """
         self.metadata = metadata
-        self.mod = Mod(metadata.folder_path, metadata.folder_path)
+        self.mod = Mod(source_path or metadata.folder_path, metadata.folder_path)
         self.root_msg = root_msg
-        self.ndf = NdfCache(self.mod)
-        self.guid_cache:            FileCache[str] = FileCache(GUID)
-        self.localization_cache:    FileCache[str] = FileCache(LOCALIZATION)
-        self.unit_id_cache:         FileCache[int] = FileCache(UNIT_ID)
-        self.guids = mg.GuidManager(self.guid_cache)
-        self.localization = ml.LocalizationManager(self.localization_cache, self.metadata.localization_prefix)
+        self.jobs = jobs
+        self.generate = generate
+        self.prefetch = list(prefetch) if prefetch is not None else [*decorated_ndf_paths(*CREATORS), *CONTEXT_PATHS]
+        # images are copied when the mod is saved
+        self.images = ImageQueue()
+        self.emblem_spec = emblem_spec
+        self.button_texture_spec = button_texture_spec
+        self.ndf = NdfCache(self.mod, NdfSnapshotCache(), memory_budget)
+        self.guid_cache:            BaseCache[str] = cache_type(GUID)
+        self.localization_cache:    BaseCache[str] = cache_type(LOCALIZATION)
+        self.unit_id_cache:         BaseCache[int] = cache_type(UNIT_ID)
+        self._vanilla_unit_ids: dict[int, str] | None = None
+        namespace = metadata.name if deterministic else None
+        self.guids = mg.GuidManager(self.guid_cache, namespace)
+        self.localization = ml.LocalizationManager(self.localization_cache, self.metadata.localization_prefix, namespace)
        
+    @property
+    def synced(self: Self) -> bool:
+        return self.mod.mod_src != self.mod.mod_dst
+
     def __enter__(self: Self) -> Self:
-        self.mod.check_if_src_is_newer()
+        # otherwise, the mod folder is synced once the files this build writes are known
+        if self.synced and not os.path.isdir(self.mod.mod_dst):
+            sync_folder(self.mod.mod_src, self.mod.mod_dst, self.root_msg)
         self.load_caches()
+        if self.jobs > 1:
+            self.ndf.prefetch(self.prefetch, self.root_msg, self.jobs)
         return self
     
     def load_ndf(self: Self, path: str, msg: Message) -> List:
@@ -57,23 +129,54 @@ class ModCreationContext(object):
         success = exc_type is None and exc_value is None and traceback is None        
         if success:
             with self.root_msg.nest("Saving mod") as write_msg:
-                self.ndf.save(write_msg)
-                self.generate_and_write_localization(write_msg)
-            self.save_caches()
+                outputs = [*self.ndf.modified,
+                           *(os.path.relpath(path, self.mod.mod_dst) for path in self.images.destinations),
+                           os.path.relpath(self.metadata.localization_path, self.mod.mod_dst)]
+                unchanged = self.ndf.save(write_msg, self.jobs)
+                unchanged += self.images.flush(write_msg)
+                unchanged += not self.generate_and_write_localization(write_msg)
+                if self.synced:
+                    sync_folder(self.mod.mod_src, self.mod.mod_dst, write_msg, exclude=outputs)
+            if self.generate:
+                unchanged += asyncio.run(self._save_caches_while_generating())
+            else:
+                unchanged += self.save_caches()
+            self.root_msg.write_line(f'{unchanged} files were unchanged and skipped')
         else:
-            pass # self.root_msg.fail()
+            # entries assigned before the failure are kept, so the next build reuses the same GUIDs and IDs
+            self.commit_caches()
 
     def load_caches(self: Self) -> None:
         with self.root_msg.nest("Loading caches...") as msg:
             for name, _ in CACHES:
-                cache: FileCache[Any] = getattr(self, f'{name}_cache')
+                cache: BaseCache[Any] = getattr(self, f'{name}_cache')
                 cache.load(msg)
 
-    def save_caches(self: Self) -> None:
-        with self.root_msg.nest("Saving caches...") as msg:
+    async def _save_caches_while_generating(self: Self) -> int:
+        # the caches are outside the mod folder, so they can be saved while GenerateMod reads it. GenerateMod's output
+        # is printed as it runs, so saving the caches is only printed once both are done
+        caches_msg = Message("Saving caches...", self.root_msg.indent + 1)
+        caches_msg.visible = False
+        generate = asyncio.create_task(bat.generate_mod_async(self.metadata, self.root_msg))
+        try:
+            return await asyncio.to_thread(self.save_caches, caches_msg)
+        finally:
+            await generate
+            self.root_msg.adopt(caches_msg)
+
+    def commit_caches(self: Self) -> None:
+        for name, _ in CACHES:
+            cache: BaseCache[Any] = getattr(self, f'{name}_cache')
+            cache.commit()
+
+    def save_caches(self: Self, caches_msg: Message | None = None) -> int:
+        """ Returns the number of caches which were unchanged """
+        unchanged = 0
+        with caches_msg or self.root_msg.nest("Saving caches...") as msg:
             for name, _ in CACHES:
-                cache: FileCache[Any] = getattr(self, f'{name}_cache')
-                cache.save(msg)
+                cache: BaseCache[Any] = getattr(self, f'{name}_cache')
+                unchanged += not cache.save(msg)
+        return unchanged
     
     def create_division(self: Self,
                         division: med.DivisionMetadata,
@@ -85,8 +188,16 @@ class ModCreationContext(object):
         with try_nest(root_msg, f"Making division {division.short_name}") as msg:
             cd.DivisionCreator(self.guids.generate(division.descriptor_name), copy_of, insert_after, division, units, **changes).apply(self.ndf, msg)
 
+    @property
+    def vanilla_unit_ids(self: Self) -> dict[int, str]:
+        """ Descriptor paths of the units in DeckSerializer by unit ID, read before any divisions are registered """
+        if self._vanilla_unit_ids is None:
+            unit_ids: Map = self.ndf.read(ndf_paths.Gameplay.Decks.DeckSerializer).by_name('DeckSerializer').value.by_member('UnitIds').value
+            self._vanilla_unit_ids = {int(row.value): row.key for row in unit_ids}
+        return self._vanilla_unit_ids
+
     def start_unit_ids_at(self: Self, initial_id: int) -> mu.UnitIdManager:
-        return mu.UnitIdManager(self.unit_id_cache, initial_id)
+        return mu.UnitIdManager(self.unit_id_cache, initial_id, reserved=self.vanilla_unit_ids)
     
     def create_unit(self: Self, name: str, country: str, copy_of: str, showroom_src: str | None = None, button_texture_src_path: str | None = None) -> cub.BasicUnitCreator:
         # TODO: msg here
@@ -123,7 +234,9 @@ class ModCreationContext(object):
                              self.metadata.folder_path,
                              "Assets/2D/Interface/UseOutGame/Division/Emblem",
                              division.emblem_namespace, 
-                             "DivisionAdditionalTextureBank")
+                             "DivisionAdditionalTextureBank",
+                             queue=self.images,
+                             spec=self.emblem_spec)
         
     def try_add_button_texture(self: Self, image_path: str | None, unit: meu.UnitMetadata) -> str | None:
         if image_path is None:
@@ -137,22 +250,22 @@ class ModCreationContext(object):
                                      self.metadata.folder_path,
                                      'Assets/2D/Interface/Common/UnitsIcons',
                                      unit.button_texture_name,
-                                     'UnitButtonTextureAdditionalBank')
+                                     'UnitButtonTextureAdditionalBank',
+                                     queue=self.images,
+                                     spec=self.button_texture_spec)
         
     def write_edits(self: Self, msg: Message | None = None) -> None:
         if msg is None:
             msg = self.root_msg
-        for edit in self.mod.edits:
-            with msg.nest(f"Writing {edit.file_path}") as _:
-                self.mod.write_edit(edit)
+        self.ndf.save(msg, self.jobs)
         
-    def generate_and_write_localization(self: Self, msg: Message | None = None) -> None:
+    def generate_and_write_localization(self: Self, msg: Message | None = None) -> bool:
+        """ Returns whether the localization file was written, i.e. whether its content changed """
         if msg is None:
             msg = self.root_msg
         csv = self.localization.generate_csv(msg)
         with msg.nest("Writing localization") as msg:
-            with open(self.metadata.localization_path, "w") as file:
-                file.write(csv)
+            return write_if_changed(self.metadata.localization_path, csv)
 
     def create_ammo(self: Self, name: str, copy_of: str) -> ca.AmmoCreator:
         return ca.AmmoCreator(self.ndf, ensure.prefix(name, f'Ammo_{self.prefix}_'), copy_of, self.guids)
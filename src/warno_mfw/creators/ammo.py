@@ -23,7 +23,7 @@ class AmmoCreator(object):
         self.msg = try_nest(self.parent_msg, f"Making {self.name}")
         self.msg.__enter__()
         with self.msg.nest(f"Copying {self.copy_of}") as _:
-            self.object = self.make_copy(self.ndf[Ammunition])
+            self.object = self.make_copy(self.ndf.read(Ammunition))
         return self
     
     def __exit__(self: Self, exc_type, exc_value, traceback):
@@ -100,7 +100,7 @@ class UnitCreator(ABC):
     # "private" methods
 
     def _make_unit(self: Self, localized_name: str, button_texture: str | None = None) -> unit_wrapper.UnitWrapper:
-        copy: Object = self.ndf[ndf_paths.Gfx.UniteDescriptor].by_name(self.src_unit.descriptor.name).value.copy()
+        copy: Object = self.ndf.read(ndf_paths.Gfx.UniteDescriptor).by_name(self.src_unit.descriptor.name).value.copy()
         edit.members(copy,
                      DescriptorId=self.ctx.guids.generate(self.new_unit.descriptor.name),
                      ClassNameForDebug=self.new_unit.class_name_for_debug)
@@ -40,7 +40,7 @@ class WeaponCreator(object):
             self.edit_ammunition(self.ndf, msg2)
 
     def make_copy(self: Self) -> Object:
-        copy: Object = self.ndf[WeaponDescriptor].by_name(self.copy_of).value.copy()
+        copy: Object = self.ndf.read(WeaponDescriptor).by_name(self.copy_of).value.copy()
         return copy
 
     @ndf_path(WeaponDescriptor)
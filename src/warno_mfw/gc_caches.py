@@ -0,0 +1,37 @@
+import argparse
+import os
+
+from warno_mfw.utils.types.cache.file import DEFAULT_FOLDER, DEFAULT_RETENTION, FileCache
+from warno_mfw.utils.types.cache.sqlite import SqliteCache
+from warno_mfw.utils.types.message import Message
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Removes cached GUIDs, localization keys and unit IDs which haven't been used by recent builds."
+    )
+    parser.add_argument('-f', '--folder',
+                        default=DEFAULT_FOLDER,
+                        type=str,
+                        help='The folder containing the caches.')
+    parser.add_argument('-r', '--retention',
+                        default=DEFAULT_RETENTION,
+                        type=int,
+                        help="Entries which weren't used by any of this many of the most recent builds are removed. 1 keeps only entries used by the last build.")
+    return parser
+
+if __name__ == '__main__':
+    args = make_parser().parse_args()
+    with Message(f'Collecting garbage in {args.folder}') as msg:
+        for name in sorted(os.listdir(args.folder)):
+            stem, extension = os.path.splitext(name)
+            if extension == '.cache':
+                cache = FileCache(stem, args.folder)
+            elif extension == '.sqlite':
+                cache = SqliteCache(stem, args.folder)
+            else:
+                continue
+            cache.load(msg)
+            msg.write_line(f'Removed {cache.gc(msg, args.retention)} entries from {name}')
+            if isinstance(cache, SqliteCache):
+                cache.connection.close()
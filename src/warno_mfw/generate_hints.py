@@ -17,7 +17,7 @@ from warno_mfw.hints._generate._folder_paths import generate_module_for_folder
 from warno_mfw.hints._generate._line_generators import (_init_lines,
                                                         _validation_lines)
 from warno_mfw.metadata.warno import WarnoMetadata
-from warno_mfw.utils import bat
+from warno_mfw.utils.skeleton import SkeletonStore
 from warno_mfw.utils.types.message import Message, try_nest
 
 
@@ -68,7 +68,7 @@ with Message('Updating reference information for the current WARNO version') as
     try:
         if os.path.exists(temp_mod_path):
             raise Exception(f'Attempted to generate reference information in folder {temp_mod_path}, but this could overwrite an existing mod!')
-        bat.reset_source(temp_mod_path, args.mod_name, warno.mods_path, msg)
+        SkeletonStore(warno).reset(temp_mod_path, args.mod_name, msg)
         with msg.nest('Loading temp mod') as msg2:
             mod = Mod(temp_mod_path, temp_mod_path)
             _add_all(mod, msg2)
@@ -79,7 +79,7 @@ with Message('Updating reference information for the current WARNO version') as
         generate_module_for_folder(temp_mod_path, os.path.join(output_path, 'paths'), 'GameData/Generated' if args.for_release else 'GameData', msg)
     # delete __TEMP__ mod
     except Exception as e:
-        print(f'Failed to generate reference information: {str(e)}')
+        msg.write_line(f'Failed to generate reference information: {str(e)}')
     finally:
         with msg.nest('Deleting temporary mod') as _:
             shutil.rmtree(temp_mod_path, ignore_errors=True)
\ No newline at end of file
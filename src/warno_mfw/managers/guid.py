@@ -1,17 +1,29 @@
 from typing import Self
-from uuid import uuid4
+from uuid import NAMESPACE_URL, UUID, uuid4, uuid5
 
-from warno_mfw.utils.types.cache.file import FileCache
+from warno_mfw.utils.types.cache.base import BaseCache
 
+# namespace of deterministic GUIDs, which are further namespaced by the mod
+NAMESPACE = uuid5(NAMESPACE_URL, 'https://github.com/dninemfive/wn-mfw')
 
 class GuidManager(object):
-    def __init__(self: Self, cache: FileCache):
+    def __init__(self: Self, cache: BaseCache[str], namespace: str | None = None):
+        """ If `namespace` is given, GUIDs which aren't cached are derived from it and their key instead of being random,
+        so any build using the same namespace generates the same GUIDs without sharing the cache. """
         self._cache = cache
+        self.namespace = namespace
+
+    def _uuid(self: Self, guid_key: str) -> UUID:
+        if self.namespace is None:
+            return uuid4()
+        return uuid5(NAMESPACE, f'{self.namespace}:{guid_key}')
     
     def generate(self: Self, guid_key: str) -> str:
         """ Generates a GUID in the format NDF expects """
         if guid_key in self._cache:
             return self._cache[guid_key]
-        result: str = f'GUID:{{{str(uuid4())}}}'
+        result: str = f'GUID:{{{str(self._uuid(guid_key))}}}'
+        if self.namespace is not None and self._cache.has_value(result):
+            raise Exception(f'GUID {result} for {guid_key} is already used by {self._cache.reverse_lookup(result)}!')
         self._cache[guid_key] = result
         return result
\ No newline at end of file
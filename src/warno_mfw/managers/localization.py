@@ -1,48 +1,59 @@
+import hashlib
 import random
 import string
 from typing import Self
 
 from warno_mfw.utils.ndf import ensure
-from warno_mfw.utils.types.cache.file import FileCache
+from warno_mfw.utils.types.cache.base import BaseCache
 from warno_mfw.utils.types.message import Message, try_nest
 
 CHARACTERS = [*string.ascii_letters, *[str(x) for x in range(10)]]
 
 class LocalizationManager(object):
-    def __init__(self: Self, cache: FileCache, prefix: str):
+    def __init__(self: Self, cache: BaseCache[str], prefix: str, namespace: str | None = None):
+        """ If `namespace` is given, keys which aren't cached are derived from it and their string instead of being random,
+        so any build using the same namespace generates the same keys without sharing the cache. """
         if len(prefix) > 5:
             raise Exception("Localization prefix cannot be longer than 5 characters, as keys must be 10 or fewer characters total!")
         self._cache = cache
         self.prefix = prefix
+        self.namespace = namespace
     
     def register(self: Self, string: str) -> str:
         """ Registers a localized string in the localization cache. Returns the __key__ generated for this string! """
         if string in self._cache:
             return f"'{self._cache[string]}'"
-        key = self.generate_key()
-        while key in self._cache.values:
-            key = self.generate_key()
+        key = self.generate_key(string)
+        attempt = 0
+        # keys are short enough to collide, so derived keys are rehashed until an unused one is found
+        while self._cache.has_value(key):
+            attempt += 1
+            key = self.generate_key(string, attempt)
         # intentionally backward: we want to be able to look up strings by their values to get their tokens
         self._cache[string] = key
         return f"'{key}'"
 
-    def generate_key(self: Self) -> str:
+    def generate_key(self: Self, string: str | None = None, attempt: int = 0) -> str:
+        """ Generates a random key, or one derived from `string` if this manager has a namespace """
         result = self.prefix
+        if self.namespace is None or string is None:
+            for _ in range(10 - len(result)):
+                result += random.choice(CHARACTERS)
+            return result
+        n = int.from_bytes(hashlib.sha256(f'{self.namespace}:{attempt}:{string}'.encode()).digest())
         for _ in range(10 - len(result)):
-            result += random.choice(CHARACTERS)
+            n, i = divmod(n, len(CHARACTERS))
+            result += CHARACTERS[i]
         return result
 
     def generate_csv(self: Self, msg: Message | None) -> str:
         result = '"TOKEN";"REFTEXT"'
         with try_nest(msg, "Generating localization") as msg2:
-            for k in sorted(self._cache.keys):
-                with msg2.nest(f"{self._cache[k]}\t{k}") as _:
-                    result += "\n" + f'"{self._cache[k]}";"{k}"'
+            # items doesn't count as using the entries, so strings which are no longer registered are eventually dropped
+            for k, v in sorted(self._cache.items):
+                with msg2.nest(f"{v}\t{k}") as _:
+                    result += "\n" + f'"{v}";"{k}"'
         return result
     
     def reverse_lookup(self: Self, token: str) -> str | None:
-        token = ensure.unquoted(token, "'")
-        for k, v in self._cache.items:
-            if v == token:
-                return k
-        return None
\ No newline at end of file
+        return self._cache.reverse_lookup(ensure.unquoted(token, "'"))
\ No newline at end of file
@@ -1,19 +1,43 @@
 from typing import Iterator, Self
 
-from warno_mfw.utils.types.cache.file import FileCache
+from warno_mfw.utils.types.cache.base import BaseCache
 
+DEFAULT_BLOCK_SIZE = 1000
 
 class UnitIdManager(object):
-    def __init__(self: Self, cache: FileCache[int], initial_id: int):
+    def __init__(self: Self, cache: BaseCache[int], initial_id: int, block_size: int = DEFAULT_BLOCK_SIZE, reserved: dict[int, str] | None = None):
+        """ Assigns unit IDs from [initial_id, initial_id + block_size), skipping IDs which are already cached or are
+        `reserved`, e.g. by vanilla units. Used IDs are looked up in the cache's value index, so this doesn't get slower
+        as more divisions share the cache. """
         self._cache = cache
-        self.current_id = max(cache.values) if cache.any else initial_id
+        self.initial_id = initial_id
+        self.block_size = block_size
+        self.reserved: dict[int, str] = reserved or {}
+        self.current_id = initial_id
+        self._registered: dict[str, int] = {}
 
     @property
-    def items(self: Self) -> Iterator[tuple[str, str]]:
-        yield from sorted(self._cache.items, key=lambda x: x[1])
+    def items(self: Self) -> Iterator[tuple[str, int]]:
+        """ The units registered with this manager and their IDs, in ID order """
+        yield from sorted(self._registered.items(), key=lambda x: x[1])
+
+    def _check_owner(self: Self, descriptor_path: str, id: int) -> None:
+        for owner in (self.reserved.get(id, None), self._cache.reverse_lookup(id)):
+            if owner is not None and owner != descriptor_path:
+                raise Exception(f'Unit ID {id} of {descriptor_path} is also used by {owner}!')
 
     def register(self: Self, descriptor_path: str) -> int:
-        if descriptor_path not in self._cache:            
-            self._cache[descriptor_path] = self.current_id
+        if descriptor_path in self._cache:
+            result = self._cache[descriptor_path]
+            self._check_owner(descriptor_path, result)
+        else:
+            end = self.initial_id + self.block_size
+            while self.current_id < end and (self.current_id in self.reserved or self._cache.has_value(self.current_id)):
+                self.current_id += 1
+            if self.current_id >= end:
+                raise Exception(f'Ran out of unit IDs between {self.initial_id} and {end - 1} while registering {descriptor_path}!')
+            result = self.current_id
+            self._cache[descriptor_path] = result
             self.current_id += 1
-        return self._cache[descriptor_path]
\ No newline at end of file
+        self._registered[descriptor_path] = result
+        return result
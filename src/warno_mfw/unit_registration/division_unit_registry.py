@@ -7,7 +7,7 @@ from ndf_parse.model import List, ListRow, Map, MapRow, MemberRow, Object
 import warno_mfw.context.mod_creation
 import warno_mfw.utils.ndf.ensure as ensure
 from warno_mfw.hints.paths.GameData.Generated.Gameplay.Decks import DeckSerializer, DivisionRules
-from warno_mfw.managers.unit_id import UnitIdManager
+from warno_mfw.managers.unit_id import DEFAULT_BLOCK_SIZE, UnitIdManager
 from warno_mfw.metadata.division import DivisionMetadata
 from warno_mfw.metadata.unit import UnitMetadata
 from warno_mfw.model.deck_unite_rule import TDeckUniteRule
@@ -39,8 +39,9 @@ class DivisionUnitRegistry(object):
         self.metadata = metadata
         self.units: list[UnitRules] = []
         self.parent_msg = parent_msg
-        self.unit_ids = UnitIdManager(ctx.unit_id_cache, metadata.id * 1000)
-        self.lookup = DivisionRuleLookup(ctx.ndf[DivisionRules], *division_priorities)
+        # each division has its own block of IDs, which mustn't overlap vanilla units or other divisions
+        self.unit_ids = UnitIdManager(ctx.unit_id_cache, metadata.id * DEFAULT_BLOCK_SIZE, reserved=ctx.vanilla_unit_ids)
+        self.lookup = DivisionRuleLookup(ctx.ndf.read(DivisionRules), *division_priorities)
     
     @ndf_path(DeckSerializer)
     def edit_deck_serializer(self: Self, ndf: List):
@@ -1,37 +1,129 @@
+from __future__ import annotations
+
+import asyncio
 import os
 # https://stackoverflow.com/a/1557364
 import shutil
+import sys
 # https://stackoverflow.com/a/5469427
 from subprocess import PIPE, Popen
+from typing import TYPE_CHECKING, Callable
 
 from warno_mfw.metadata.mod import ModMetadata
 from warno_mfw.metadata.warno import WarnoMetadata
+from warno_mfw.utils.sync import Manifest, sync_folder
+from warno_mfw.utils.types.cache.file import DEFAULT_FOLDER
 from warno_mfw.utils.types.message import Message, try_nest
 
+if TYPE_CHECKING:
+    from warno_mfw.utils.skeleton import SkeletonStore
 
-def run_bat(msg: Message | None, folder: str, name: str, *args):
-    path = os.path.join(folder, f'{name}.bat')
+def bat_command(folder: str, name: str, *args: str) -> list[str]:
     # https://stackoverflow.com/a/11729668
-    path_and_args = [path, *args, '<nul']
-    with try_nest(msg, f"Running `{" ".join(path_and_args)}`\n     in `{folder}`", force_nested=True) as this_msg:
+    return [os.path.join(folder, f'{name}.bat'), *args, '<nul']
+
+def python_command(folder: str, name: str, *args: str) -> list[str]:
+    """ Runs `{name}.py` with the current interpreter, e.g. to stand in for the game's .bat files on other platforms """
+    return [sys.executable, os.path.abspath(os.path.join(folder, f'{name}.py')), *args]
+
+# builds the command run_bat and run_bat_async run for a script name; replace with python_command to run stand-ins
+command_builder: Callable[..., list[str]] = bat_command
+
+def _running_msg(msg: Message | None, folder: str, command: list[str]) -> Message:
+    return try_nest(msg, f"Running `{" ".join(command)}`\n     in `{folder}`", force_nested=True)
+
+def run_bat(msg: Message | None, folder: str, name: str, *args) -> int:
+    path_and_args = command_builder(folder, name, *args)
+    with _running_msg(msg, folder, path_and_args) as this_msg:
         # https://stackoverflow.com/a/2813530
         process = Popen(path_and_args, cwd=folder, stdout=PIPE)
         while True:
             line = process.stdout.readline()
             if not line:
                 break
-            print(f'{this_msg.indent_str}  {line.strip().decode()}')
-        process.wait()
+            this_msg.write_line(line.strip().decode())
+        return process.wait()
+
+async def run_bat_async(msg: Message | None, folder: str, name: str, *args) -> int:
+    """ Like run_bat, but lets other tasks run while waiting on the script's output """
+    path_and_args = command_builder(folder, name, *args)
+    with _running_msg(msg, folder, path_and_args) as this_msg:
+        process = await asyncio.create_subprocess_exec(*path_and_args, cwd=folder, stdout=asyncio.subprocess.PIPE)
+        async for line in process.stdout:
+            this_msg.write_line(line.strip().decode())
+        return await process.wait()
 
-def reset_source(mod_path: str, mod_name: str, warno_mods_path: str, msg: Message | None = None):
+def create_new_mod(mod_path: str, mod_name: str, warno_mods_path: str, msg: Message | None = None):
+    """ Recreates the mod at `mod_path` with CreateNewMod.bat """
     with try_nest(msg, "Resetting source") as msg2:
         with msg2.nest("Deleting existing files") as _:
             shutil.rmtree(mod_path, ignore_errors=True)
         run_bat(msg, warno_mods_path, "CreateNewMod", mod_name)
 
-def reset_source_for(mod: ModMetadata, msg: Message | None = None):
-    reset_source(mod.folder_path, mod.name, mod.warno.mods_path, msg)
+def reset_source(mod_path: str,
+                 mod_name: str,
+                 warno_mods_path: str,
+                 msg: Message | None = None,
+                 source_path: str | None = None,
+                 skeletons: SkeletonStore | None = None):
+    """ Makes the mod at `mod_path` a new mod. It's only created with CreateNewMod.bat the first time for each game
+    build; afterwards, it's synced from the copy `skeletons` (by default, the SkeletonStore for the game whose Mods
+    folder is `warno_mods_path`) stored then. If `source_path` is given, the mod is instead synced from that folder.
+    Syncing only copies the files that differ. """
+    if source_path is not None:
+        sync_folder(source_path, mod_path, msg)
+        return
+    if skeletons is None:
+        # imported here because skeleton creates mods with this module
+        from warno_mfw.utils.skeleton import SkeletonStore
+        skeletons = SkeletonStore(WarnoMetadata(os.path.dirname(os.path.normpath(warno_mods_path))))
+    skeletons.reset(mod_path, mod_name, msg)
+
+def reset_source_for(mod: ModMetadata, msg: Message | None = None, source_path: str | None = None, skeletons: SkeletonStore | None = None):
+    reset_source(mod.folder_path, mod.name, mod.warno.mods_path, msg, source_path, skeletons)
+
+# GameData as of the last successful GenerateMod, kept apart from the manifests sync_folder uses
+GENERATED_MANIFEST_FOLDER = os.path.join(DEFAULT_FOLDER, 'generated')
+
+def _changed_since_generate(path: str, msg: Message | None) -> Manifest | None:
+    """ Returns the current manifest of the mod's GameData if it changed since GenerateMod last succeeded, otherwise None """
+    folder = os.path.join(path, 'GameData')
+    with try_nest(msg, 'Checking for changes since the last GenerateMod') as msg2:
+        current = Manifest(folder, GENERATED_MANIFEST_FOLDER).refresh()
+        last = Manifest(folder, GENERATED_MANIFEST_FOLDER).load()
+        if not any(last.entries):
+            msg2.write_line('No previous GenerateMod recorded')
+            return current
+        changed = current.changed(last)
+        if not any(changed):
+            return None
+        with msg2.nest(f'{len(changed)} files changed', force_nested=True) as msg3:
+            for rel_path in changed:
+                msg3.write_line(rel_path)
+        return current
+
+def _save_generated(manifest: Manifest, msg: Message | None) -> None:
+    with try_nest(msg, 'Saving GameData manifest') as _:
+        for rel_path in manifest.entries:
+            manifest.hash(rel_path)
+        manifest.save()
+
+def generate_mod(path_or_metadata: str | ModMetadata, msg: Message | None = None, force: bool = False) -> bool:
+    """ Runs GenerateMod.bat unless the mod's GameData is identical to when it last succeeded or `force` is True.
+    Returns whether it was run. """
+    path = path_or_metadata.folder_path if isinstance(path_or_metadata, ModMetadata) else path_or_metadata
+    manifest = _changed_since_generate(path, msg)
+    if manifest is None and not force:
+        return False
+    if run_bat(msg, path, "GenerateMod") == 0 and manifest is not None:
+        _save_generated(manifest, msg)
+    return True
 
-def generate_mod(path_or_metadata: str | ModMetadata, msg: Message | None = None):
+async def generate_mod_async(path_or_metadata: str | ModMetadata, msg: Message | None = None, force: bool = False) -> bool:
     path = path_or_metadata.folder_path if isinstance(path_or_metadata, ModMetadata) else path_or_metadata
-    run_bat(msg, path, "GenerateMod")
\ No newline at end of file
+    manifest = _changed_since_generate(path, msg)
+    if manifest is None and not force:
+        return False
+    if await run_bat_async(msg, path, "GenerateMod") == 0 and manifest is not None:
+        _save_generated(manifest, msg)
+    return True
\ No newline at end of file
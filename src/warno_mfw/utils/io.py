@@ -1,3 +1,10 @@
+import filecmp
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, TextIO
+
+BUFFER_SIZE = 1024 * 1024
+
 def try_read(path: str) -> str | None:
     try:
         with open(path) as f:
@@ -15,4 +22,48 @@ def load_file(path: str, default: object | None = None) -> object | None:
     
 def write_file(obj: object, path: str):
     with open(path, "w") as f:
-        f.write(repr(obj))
\ No newline at end of file
+        f.write(repr(obj))
+
+def write_if_changed(path: str, text: str, encoding: str | None = None) -> bool:
+    return stream_if_changed(path, lambda f: f.write(text), encoding)
+
+def stream_if_changed(path: str, write: Callable[[TextIO], Any], encoding: str | None = None) -> bool:
+    """ Calls `write` with a buffered handle to a temporary file, which replaces `path` unless their contents are identical.
+    Since the file is renamed into place, it is never left half-written. Returns whether `path` was replaced. """
+    tmp_path = f'{path}.tmp'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(tmp_path, 'w', encoding=encoding, buffering=BUFFER_SIZE) as f:
+        write(f)
+    if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """ Holds an exclusive advisory lock on `path`, creating it if necessary and waiting until other processes release it """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a+b') as file:
+        if os.name == 'nt':
+            import msvcrt
+            file.seek(0)
+            # LK_LOCK gives up after 10 seconds, so keep trying
+            while True:
+                try:
+                    msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+            try:
+                yield
+            finally:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
@@ -1,25 +1,45 @@
-from typing import Any, Callable
+from typing import Any, Callable, Iterable
 
 from ndf_parse.model import List
+from warno_mfw.utils.types.cache.ndf import NdfCache
 from warno_mfw.utils.types.message import Message, try_nest
 
 
 def editing_or_reading(save: bool):
     return 'Editing' if save else 'Reading'
 
+def _get(ndf: dict[str, List], path: str, save: bool) -> List:
+    if isinstance(ndf, NdfCache):
+        return ndf.edit(path) if save else ndf.read(path)
+    return ndf[path]
+
 def ndf_path(path: str, save: bool = True):
     """
     Decorator which allows defining NDF edits to a particular file:
 
     @ndf_path("Divisions.ndf")
+
+    If `save` is False, the file is opened with NdfCache.read() and can't be modified.
     """
     def decorate(f: Callable[..., None]):
         # @wraps doesn't understand self (afaict) so using it here is counterproductive
         def wrap(self: Any, ndf: dict[str, List], msg: Message | None, *args: Any, **kwargs: Any):
             with try_nest(msg, f"{editing_or_reading(save)} {path}") as _:
-                return f(self, ndf[path], *args, **kwargs)
+                return f(self, _get(ndf, path, save), *args, **kwargs)
+        wrap._ndf_path = path
         return wrap
     # lost the link but this was suggested in a StackExchange post
     decorate._ndf_path = path
     return decorate
+
+def ndf_paths(*types: type) -> Iterable[str]:
+    """ Yields the path of every method decorated with @ndf_path on the specified types or their bases """
+    yielded: set[str] = set()
+    for t in types:
+        for cls in t.__mro__:
+            for member in vars(cls).values():
+                path = getattr(member, '_ndf_path', None)
+                if path is not None and path not in yielded:
+                    yielded.add(path)
+                    yield path
     
\ No newline at end of file
@@ -1,9 +1,121 @@
+import filecmp
+import hashlib
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Self
 
 from warno_mfw.utils.ndf import ensure
+from warno_mfw.utils.sync import _hash_file
+from warno_mfw.utils.types.cache.file import DEFAULT_FOLDER
+from warno_mfw.utils.types.message import Message, try_nest
 from ndf_parse.model import List, ListRow, Object
 
+DEFAULT_IMAGE_CACHE_FOLDER = os.path.join(DEFAULT_FOLDER, 'images')
+
+def _replace_file(src_path: str, dst_path: str, link: bool = False) -> None:
+    # the existing file may be hardlinked to the mod's source, so replace it rather than writing into it
+    tmp_path = f'{dst_path}.tmp'
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        if not link:
+            raise OSError
+        os.link(src_path, tmp_path)
+    except OSError:
+        shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, dst_path)
+
+@dataclass(frozen=True)
+class ImageSpec(object):
+    """ Format and dimensions an image is converted to before being copied into the mod. `format` is a Pillow format name. """
+    format: str = 'PNG'
+    mode: str = 'RGBA'
+    size: tuple[int, int] | None = None
+    # if False, images of the wrong size are rejected rather than resized
+    resize: bool = True
+    # source formats which are accepted, or None to accept anything Pillow can read
+    source_formats: tuple[str, ...] | None = None
+
+    @property
+    def extension(self: Self) -> str:
+        return f'.{self.format.lower()}'
+
+def preprocess_image(src_file_path: str, spec: ImageSpec, cache_folder: str = DEFAULT_IMAGE_CACHE_FOLDER) -> str:
+    """ Returns the path to a copy of the image converted to match `spec`. Conversions are stored in `cache_folder` by
+    source hash and spec, so each image is only converted once. Requires Pillow. """
+    key = hashlib.sha256(f'{_hash_file(src_file_path)}:{spec!r}'.encode()).hexdigest()[:32]
+    result_path = os.path.join(cache_folder, f'{key}{spec.extension}')
+    if os.path.exists(result_path):
+        return result_path
+    try:
+        from PIL import Image
+    except ImportError:
+        raise Exception('Preprocessing images requires Pillow! Install it with `pip install warno-mod-framework[images]`.')
+    with Image.open(src_file_path) as image:
+        if spec.source_formats is not None and image.format not in spec.source_formats:
+            raise Exception(f'{src_file_path} is a {image.format} image, but must be one of {", ".join(spec.source_formats)}!')
+        if spec.size is not None and image.size != spec.size and not spec.resize:
+            raise Exception(f'{src_file_path} is {image.size[0]}x{image.size[1]}, but must be {spec.size[0]}x{spec.size[1]}!')
+        result = image.convert(spec.mode)
+        if spec.size is not None and result.size != spec.size:
+            result = result.resize(spec.size, Image.Resampling.LANCZOS)
+        os.makedirs(cache_folder, exist_ok=True)
+        tmp_path = f'{result_path}.tmp'
+        result.save(tmp_path, format=spec.format)
+        os.replace(tmp_path, result_path)
+    return result_path
+
+class ImageQueue(object):
+    """ Images to copy into the mod folder, which are copied all at once by flush() rather than as they're added """
+    def __init__(self: Self):
+        self._copies: dict[str, str] = {}
+
+    def add(self: Self, src_file_path: str, dst_file_path: str) -> None:
+        self._copies[os.path.normcase(os.path.abspath(dst_file_path))] = os.path.abspath(src_file_path)
+
+    @property
+    def destinations(self: Self) -> list[str]:
+        """ Absolute paths of every queued image's destination """
+        return sorted(self._copies.keys())
+
+    def flush(self: Self, msg: Message | None = None, jobs: int | None = None) -> int:
+        """ Copies every queued image using `jobs` threads, returning how many were already in place. Copying is
+        mostly waiting on the disk, so by default as many threads are used as ThreadPoolExecutor picks.
+
+        Each distinct source is hashed once. Images whose destination already matches are skipped, and images with
+        identical content are copied once and then hardlinked where the filesystem allows. """
+        if not any(self._copies):
+            return 0
+        with try_nest(msg, f'Copying {len(self._copies)} images') as _:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                sources = sorted(set(self._copies.values()))
+                hashes = dict(zip(sources, pool.map(_hash_file, sources)))
+                # the first destination of each distinct image is copied, and the others are linked to it
+                first: dict[str, str] = {}
+                for dst, src in sorted(self._copies.items()):
+                    first.setdefault(hashes[src], dst)
+                def copy(dst: str, src: str) -> bool:
+                    if os.path.exists(dst) and filecmp.cmp(src, dst, shallow=False):
+                        return False
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    _replace_file(src, dst)
+                    return True
+                copied = list(pool.map(copy, first.values(), (self._copies[dst] for dst in first.values())))
+                skipped = len(copied) - sum(copied)
+                for dst, src in sorted(self._copies.items()):
+                    original = first[hashes[src]]
+                    if dst == original:
+                        continue
+                    if os.path.exists(dst) and filecmp.cmp(original, dst, shallow=False):
+                        skipped += 1
+                        continue
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    _replace_file(original, dst, link=True)
+            self._copies.clear()
+            return skipped
+
 
 def add_image(ndf_file: List,
               src_file_path: str,
@@ -11,12 +123,16 @@ def add_image(ndf_file: List,
               folder_relative_to_gamedata: str,
               image_name: str,
               texture_bank_name: str,
-              image_type: str = 'TUIResourceTexture_Common') -> str:
+              image_type: str = 'TUIResourceTexture_Common',
+              queue: ImageQueue | None = None,
+              spec: ImageSpec | None = None) -> str:
     texture_obj = make_image_obj(src_file_path,
                                  mod_output_path,
                                  folder_relative_to_gamedata,
                                  image_name,
-                                 image_type)
+                                 image_type,
+                                 queue,
+                                 spec)
     ndf_file.add(ListRow(texture_obj, namespace=image_name))
     add_texture_to_texture_bank(ndf_file.by_name(texture_bank_name).value, f'{image_name}', f'~/{image_name}')
     return f'"{image_name}"'
@@ -27,29 +143,51 @@ def add_image_literal(ndf_file: List,
                       folder_relative_to_gamedata: str,
                       image_name: str,
                       texture_bank_name: str,
-                      image_type: str = 'TUIResourceTexture') -> str:
+                      image_type: str = 'TUIResourceTexture',
+                      queue: ImageQueue | None = None,
+                      spec: ImageSpec | None = None) -> str:
     texture_obj = make_image_obj(src_file_path,
                                  mod_output_path,
                                  folder_relative_to_gamedata,
                                  image_name,
-                                 image_type)
+                                 image_type,
+                                 queue,
+                                 spec)
     add_texture_to_texture_bank(ndf_file.by_name(texture_bank_name).value, f'{image_name}', texture_obj)
     return f'{image_name}'
 
-def copy_image_to_mod_folder(src_file_path: str, mod_output_path: str, folder_relative_to_gamedata: str, image_name: str) -> str:
+def copy_image_to_mod_folder(src_file_path: str,
+                             mod_output_path: str,
+                             folder_relative_to_gamedata: str,
+                             image_name: str,
+                             queue: ImageQueue | None = None,
+                             spec: ImageSpec | None = None) -> str:
+    """ Copies the image immediately, or when `queue` is flushed if it's given. Returns its path in GameData.
+    If `spec` is given, the image is converted to match it first. """
+    if spec is not None:
+        src_file_path = preprocess_image(src_file_path, spec)
     destination_folder = os.path.join(mod_output_path, "GameData", folder_relative_to_gamedata)
-    os.makedirs(destination_folder, exist_ok=True)
     dst_image_filename = f'{image_name}{os.path.splitext(src_file_path)[1]}'
     result_path = os.path.join(destination_folder, dst_image_filename)
-    shutil.copyfile(src_file_path, result_path)
+    if queue is not None:
+        queue.add(src_file_path, result_path)
+    else:
+        os.makedirs(destination_folder, exist_ok=True)
+        _replace_file(src_file_path, result_path)
     return gamedata_path(mod_output_path, result_path)
 
 def gamedata_path(mod_output_path: str, path: str) -> str:
     return f'GameData:/{os.path.relpath(path, os.path.join(mod_output_path, 'GameData'))}'
 
-def make_image_obj(src_file_path: str, mod_output_path: str, folder_relative_to_gamedata: str, image_name: str, texture_type: str) -> Object:
+def make_image_obj(src_file_path: str,
+                   mod_output_path: str,
+                   folder_relative_to_gamedata: str,
+                   image_name: str,
+                   texture_type: str,
+                   queue: ImageQueue | None = None,
+                   spec: ImageSpec | None = None) -> Object:
     return ensure.NdfObject(texture_type,
-                          FileName=f'"{copy_image_to_mod_folder(src_file_path, mod_output_path, folder_relative_to_gamedata, image_name)}"')
+                          FileName=f'"{copy_image_to_mod_folder(src_file_path, mod_output_path, folder_relative_to_gamedata, image_name, queue, spec)}"')
 
 def add_texture_to_texture_bank(texture_bank: Object, image_key: str, normal_state: Object | str, other_states: dict[str, Object | str] = {}) -> str:
     states: dict[str, Object] = {'~/ComponentState/Normal':normal_state}
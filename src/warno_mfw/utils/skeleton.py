@@ -0,0 +1,67 @@
+import hashlib
+import os
+import shutil
+from typing import Callable, Self
+
+from warno_mfw.metadata.warno import WarnoMetadata
+from warno_mfw.utils import bat
+from warno_mfw.utils.sync import sync_folder
+from warno_mfw.utils.types.cache.file import DEFAULT_FOLDER
+from warno_mfw.utils.types.message import Message, try_nest
+
+DEFAULT_SKELETON_FOLDER = os.path.join(DEFAULT_FOLDER, 'skeletons')
+
+def build_id(warno: WarnoMetadata) -> str:
+    """ Identifies the installed game build by the names, sizes and modification times of the files at the top of
+    the installation and Mods folders, which change whenever the game is updated. """
+    h = hashlib.sha256()
+    for folder in (warno.base_path, warno.mods_path):
+        for entry in sorted(os.scandir(folder), key=lambda x: x.name):
+            if entry.is_file():
+                stat = entry.stat()
+                h.update(f'{entry.name}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+    return h.hexdigest()[:16]
+
+class SkeletonStore(object):
+    """ Pristine copies of mods as created by CreateNewMod.bat, one per game build and mod name.
+
+    The first reset of a mod for a given build creates it as usual and stores a copy; later resets sync the mod
+    folder from that copy instead. Mods are stored by name since CreateNewMod.bat may write it into the files it creates. """
+    def __init__(self: Self,
+                 warno: WarnoMetadata,
+                 folder: str = DEFAULT_SKELETON_FOLDER,
+                 build: str | None = None,
+                 create: Callable[[str, str, Message | None], None] | None = None):
+        """ `build` overrides the detected game build and `create(mod_path, mod_name, msg)` replaces running
+        CreateNewMod.bat, e.g. to copy a fixture folder when the game isn't installed. """
+        self.warno = warno
+        self.folder = folder
+        self.build = build or build_id(warno)
+        self.create = create or (lambda mod_path, mod_name, msg: bat.create_new_mod(mod_path, mod_name, warno.mods_path, msg))
+
+    def path(self: Self, mod_name: str) -> str:
+        return os.path.join(self.folder, self.build, mod_name)
+
+    def reset(self: Self, mod_path: str, mod_name: str, msg: Message | None = None) -> None:
+        """ Makes `mod_path` a pristine copy of the mod named `mod_name` for the current build """
+        skeleton_path = self.path(mod_name)
+        # never linked, since builds write into the mod's files and would change the stored skeleton too
+        if os.path.exists(skeleton_path):
+            sync_folder(skeleton_path, mod_path, msg, link=False)
+            return
+        with try_nest(msg, f'Creating skeleton of {mod_name} for build {self.build}') as msg2:
+            self.create(mod_path, mod_name, msg2)
+            # copied to a temporary folder first so an interrupted copy is never mistaken for a skeleton
+            tmp_path = f'{skeleton_path}.tmp'
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            sync_folder(mod_path, tmp_path, msg2, link=False)
+            os.replace(tmp_path, skeleton_path)
+            self.prune(msg2)
+
+    def prune(self: Self, msg: Message | None = None) -> None:
+        """ Deletes the skeletons of every other build """
+        for name in os.listdir(self.folder):
+            if name != self.build:
+                with try_nest(msg, f'Deleting skeletons for build {name}') as _:
+                    shutil.rmtree(os.path.join(self.folder, name), ignore_errors=True)
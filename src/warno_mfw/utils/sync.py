@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Iterable, Self
+
+from warno_mfw.utils.types.cache.file import DEFAULT_FOLDER
+from warno_mfw.utils.types.message import Message, try_nest
+
+DEFAULT_MANIFEST_FOLDER = os.path.join(DEFAULT_FOLDER, 'manifests')
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()
+
+class Manifest(object):
+    """ Size, modification time and hash of every file in a folder, by path relative to that folder.
+
+    Hashes are computed only when needed and stored between runs, so a file is only hashed again if its size or
+    modification time changes. """
+    def __init__(self: Self, folder: str, manifest_folder: str = DEFAULT_MANIFEST_FOLDER):
+        self.folder = folder
+        name = hashlib.sha256(os.path.normcase(os.path.abspath(folder)).encode()).hexdigest()[:16]
+        self.path = os.path.join(manifest_folder, f'{name}.json')
+        self.entries: dict[str, tuple[int, int, str | None]] = {}
+
+    def _read(self: Self) -> dict[str, tuple[int, int, str | None]]:
+        try:
+            with open(self.path) as file:
+                return {k: tuple(v) for k, v in json.load(file).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def load(self: Self) -> Self:
+        """ Loads the entries as of when the manifest was last saved, without scanning the folder """
+        self.entries = self._read()
+        return self
+
+    def refresh(self: Self) -> Self:
+        """ Scans the folder, keeping the stored hashes of files which haven't changed since the manifest was saved """
+        previous = self._read()
+        self.entries = {}
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                rel_path = os.path.relpath(path, self.folder)
+                size, mtime, digest = previous.get(rel_path, (None, None, None))
+                if (size, mtime) != (stat.st_size, stat.st_mtime_ns):
+                    digest = None
+                self.entries[rel_path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return self
+
+    def hash(self: Self, rel_path: str) -> str:
+        size, mtime, digest = self.entries[rel_path]
+        if digest is None:
+            digest = _hash_file(os.path.join(self.folder, rel_path))
+            self.entries[rel_path] = (size, mtime, digest)
+        return digest
+
+    def update(self: Self, rel_path: str, digest: str | None = None) -> None:
+        stat = os.stat(os.path.join(self.folder, rel_path))
+        self.entries[rel_path] = (stat.st_size, stat.st_mtime_ns, digest)
+
+    def changed(self: Self, other: Self) -> list[str]:
+        """ Returns the paths of files which differ between this manifest and `other`, or are only in one of them """
+        result = []
+        for rel_path in sorted(self.entries.keys() | other.entries.keys()):
+            if rel_path not in self.entries or rel_path not in other.entries \
+                or self.entries[rel_path][0] != other.entries[rel_path][0] \
+                or self.hash(rel_path) != other.hash(rel_path):
+                result.append(rel_path)
+        return result
+
+    def save(self: Self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self.entries, file)
+        os.replace(tmp_path, self.path)
+
+def _same_file(src: Manifest, dst: Manifest, rel_path: str) -> bool:
+    if rel_path not in dst.entries or src.entries[rel_path][0] != dst.entries[rel_path][0]:
+        return False
+    if os.path.samefile(os.path.join(src.folder, rel_path), os.path.join(dst.folder, rel_path)):
+        return True
+    return src.hash(rel_path) == dst.hash(rel_path)
+
+def _copy(src_path: str, dst_path: str, link: bool) -> None:
+    # remove rather than overwrite, so a hardlink to the source is never written through
+    if os.path.lexists(dst_path):
+        os.remove(dst_path)
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    if link:
+        try:
+            os.link(src_path, dst_path)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src_path, dst_path)
+
+def sync_folder(src: str, dst: str, msg: Message | None = None, link: bool = False, exclude: Iterable[str] = ()) -> int:
+    """ Makes `dst` a copy of `src`, copying only files whose content differs and deleting files which aren't in `src`.
+    Returns the number of files copied or deleted.
+
+    Files in `exclude`, given relative to `dst`, are left as they are: they're neither copied over nor deleted.
+
+    If `link` is True, files are hardlinked where the filesystem allows instead of copied. Only use this if nothing
+    will write into files in either folder afterwards: writing into a linked file, e.g. with Mod.write_edit or
+    open(path, 'w'), changes it in both folders. Replacing the file, as NdfCache.save does, is safe. """
+    with try_nest(msg, f'Syncing {dst}') as msg2:
+        with msg2.nest('Scanning files') as _:
+            src_manifest, dst_manifest = Manifest(src).refresh(), Manifest(dst).refresh()
+        excluded = {os.path.normcase(os.path.normpath(rel_path)) for rel_path in exclude}
+        copied = 0
+        with msg2.nest('Copying changed files') as _:
+            for rel_path in sorted(src_manifest.entries):
+                if os.path.normcase(rel_path) in excluded or _same_file(src_manifest, dst_manifest, rel_path):
+                    continue
+                _copy(os.path.join(src, rel_path), os.path.join(dst, rel_path), link)
+                dst_manifest.update(rel_path, src_manifest.entries[rel_path][2])
+                copied += 1
+        removed = [rel_path for rel_path in dst_manifest.entries
+                   if rel_path not in src_manifest.entries and os.path.normcase(rel_path) not in excluded]
+        with msg2.nest('Deleting extra files') as _:
+            for rel_path in removed:
+                os.remove(os.path.join(dst, rel_path))
+                del dst_manifest.entries[rel_path]
+        with msg2.nest(f'Copied {copied} and deleted {len(removed)} of {len(src_manifest.entries)} files') as _:
+            src_manifest.save()
+            dst_manifest.save()
+        return copied + len(removed)
@@ -18,12 +18,26 @@ class BaseCache(Generic[V]):
     def __contains__(self: Self, key: str) -> bool:
         return key in self._data
 
+    def reverse_lookup(self: Self, val: V) -> str | None:
+        """ Returns a key whose value is `val`, or None if there isn't one """
+        for k, v in self._data.items():
+            if v == val:
+                return k
+        return None
+
+    def has_value(self: Self, val: V) -> bool:
+        return self.reverse_lookup(val) is not None
+
     def load(self: Self, parent_msg: Message | None = None) -> None:
         raise NotImplemented
 
     def save(self: Self, parent_msg: Message | None = None) -> None:
         raise NotImplemented
 
+    def commit(self: Self) -> None:
+        """ Persists the entries assigned so far without counting as a build, e.g. when a build fails """
+        pass
+
     @property
     def keys(self: Self) -> Iterator[str]:
         yield from self._data.keys()
@@ -1,36 +1,259 @@
+import ast
+import glob
+import json
 import os
 from collections import defaultdict
-from typing import Self, TypeVar
+from typing import Any, Iterator, Self, TextIO, TypeVar
 
-from warno_mfw.utils.io import load_file, write_file
+from warno_mfw.utils.io import file_lock, stream_if_changed
 from warno_mfw.utils.types.message import Message, try_nest
 
 from .base import BaseCache
 
 V = TypeVar('V')
 DEFAULT_FOLDER = rf"script\_cache"
+# files are JSON lines: a header, then one [key, value] per line. The number of builds saved so far and the last build
+# each key was used in are kept in a separate file, so the cache file itself only changes when its entries do
+FORMAT = 'warno_mfw.FileCache'
+FORMAT_VERSION = 3
+BUILDS_SUFFIX = '.builds'
+# how many builds an entry is kept for after the last build which used it
+DEFAULT_RETENTION = 10
+
+def _header() -> dict[str, Any]:
+    return {'format': FORMAT, 'version': FORMAT_VERSION}
+
+def _read_builds(path: str) -> tuple[int, dict[str, int]]:
+    try:
+        with open(f'{path}{BUILDS_SUFFIX}', encoding='utf-8') as file:
+            builds = json.load(file)
+        return (builds['build'], builds['last_seen'])
+    except (OSError, ValueError, KeyError):
+        return (0, {})
+
+def read_cache_generations(path: str) -> tuple[int, dict[str, Any], dict[str, int]]:
+    """ Reads a cache file, returning the number of builds saved to it, its data, and the last build each key was used in.
+    Reads older formats too, treating their entries as used by the last build. """
+    if not os.path.exists(path):
+        return (0, {}, {})
+    with open(path, encoding='utf-8') as file:
+        try:
+            header = json.loads(file.readline())
+        # includes UnicodeDecodeError from legacy files in other encodings
+        except ValueError:
+            header = None
+        if isinstance(header, dict) and header.get('format') == FORMAT:
+            version = header.get('version', 0)
+            if version > FORMAT_VERSION:
+                raise Exception(f'{path} was written by a newer version of the framework (format version {version})!')
+            # version 2 files kept the build counter in the header and the last build each key was used in on its line
+            build: int = header.get('build', 0)
+            data, last_seen = {}, {}
+            for line in file:
+                if not line.strip():
+                    continue
+                k, v, *rest = json.loads(line)
+                data[k] = v
+                if rest:
+                    last_seen[k] = rest[0]
+            if version >= 3:
+                build, last_seen = _read_builds(path)
+            return (build, data, {k: last_seen.get(k, build) for k in data})
+    data = _read_legacy_cache_file(path)
+    return (0, data, {k: 0 for k in data})
+
+def read_cache_file(path: str) -> dict[str, Any]:
+    """ Reads a cache file, including ones written as a dict's repr before the format was versioned """
+    return read_cache_generations(path)[1]
+
+def _read_legacy_cache_file(path: str) -> dict[str, Any]:
+    # legacy files are the repr of a dict, written in the default encoding
+    with open(path) as file:
+        text = file.read()
+    if not text.strip():
+        return {}
+    try:
+        result = ast.literal_eval(text)
+    except (ValueError, SyntaxError) as e:
+        raise Exception(f'Could not read cache file {path}: {e}')
+    if not isinstance(result, dict):
+        raise Exception(f'Could not read cache file {path}: expected a dict, but got a {type(result).__name__}!')
+    return result
+
+def write_cache_file(path: str, data: dict[str, Any], build: int = 0, last_seen: dict[str, int] | None = None) -> bool:
+    """ Writes `data` sorted by key, returning whether the file's content changed. `build` and the last build each key
+    was used in are written to a separate file; keys missing from `last_seen` are recorded as used by `build`. """
+    last_seen = last_seen or {}
+    def write(file: TextIO) -> None:
+        file.write(f'{json.dumps(_header())}\n')
+        for k in sorted(data.keys()):
+            file.write(f'{json.dumps([k, data[k]], ensure_ascii=False)}\n')
+    def write_builds(file: TextIO) -> None:
+        json.dump({'build': build, 'last_seen': {k: last_seen.get(k, build) for k in sorted(data.keys())}}, file, ensure_ascii=False)
+    written = stream_if_changed(path, write, 'utf-8')
+    stream_if_changed(f'{path}{BUILDS_SUFFIX}', write_builds, 'utf-8')
+    return written
+
+def read_journal(path: str) -> Iterator[tuple[str, Any]]:
+    """ Yields the [key, value] pairs in a journal, in the order they were written """
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                k, v = json.loads(line)
+            # a line is incomplete if the process was killed while writing it
+            except ValueError:
+                continue
+            yield (k, v)
 
 class FileCache(BaseCache[V]):
-    def __init__(self: Self,  name: str, folder: str = DEFAULT_FOLDER):
+    """ Cache which is saved to a file. Values set since the last save are appended to a journal as soon as they're set,
+    so they survive a crash or failed build and are replayed on the next load.
+
+    Each save counts as a build. Entries are kept until `retention` builds have been saved without using them, so
+    builds which only create part of a mod don't discard the other parts' GUIDs and IDs. Builds are counted in a
+    separate file, so the cache file is only written when its entries change.
+
+    Several processes can share a cache: each has its own journal, and saving locks the file and merges in entries
+    saved by other processes since this one loaded it. Since cached values are identifiers, saving fails if another
+    process assigned a different value to the same key or the same value to a different key. """
+    def __init__(self: Self,  name: str, folder: str = DEFAULT_FOLDER, retention: int = DEFAULT_RETENTION):
         self.file_path = os.path.join(folder, f'{name}.cache')
-        self._accessed: defaultdict[str, bool] = defaultdict(lambda: False)        
+        self.lock_path = f'{self.file_path}.lock'
+        self.retention = retention
+        self.build = 0
+        self._last_seen: dict[str, int] = {}
+        self.journal_path = f'{self.file_path}.{os.getpid()}.journal'
+        self._journal: TextIO | None = None
+        # journals of other processes replayed on load, and their size at the time
+        self._replayed: dict[str, int] = {}
+        # keys whose values were set by this process rather than loaded
+        self._assigned: set[str] = set()
+        # value -> key, built the first time it's needed
+        self._reverse: dict[V, str] | None = None
+        self._accessed: defaultdict[str, bool] = defaultdict(lambda: False)
 
     def __getitem__(self: Self, key: str) -> V:
         self._accessed[key] = True
         return super().__getitem__(key)
-    
+
     def __setitem__(self: Self, key: str, val: V):
         self._accessed[key] = True
+        if key not in self._data or self._data[key] != val:
+            self._append_to_journal(key, val)
+            self._assigned.add(key)
+        if self._reverse is not None:
+            if key in self._data and self._reverse.get(self._data[key], None) == key:
+                del self._reverse[self._data[key]]
+            self._reverse.setdefault(val, key)
         super().__setitem__(key, val)
 
     def __contains__(self: Self, key: str) -> bool:
         self._accessed[key] = True
         return super().__contains__(key)
 
+    def reverse_lookup(self: Self, val: V) -> str | None:
+        if self._reverse is None:
+            self._reverse = {}
+            for k, v in self._data.items():
+                self._reverse.setdefault(v, k)
+        return self._reverse.get(val, None)
+
+    def _append_to_journal(self: Self, key: str, val: V) -> None:
+        # another process removes this journal when it saves the entries replayed from it
+        if self._journal is not None and os.fstat(self._journal.fileno()).st_nlink == 0:
+            self._journal.close()
+            self._journal = None
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.journal_path) or '.', exist_ok=True)
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._journal.write(f'{json.dumps([key, val], ensure_ascii=False)}\n')
+        self._journal.flush()
+
+    def _journal_paths(self: Self) -> list[str]:
+        # includes the unnumbered journal written before journals were per-process
+        return sorted(glob.glob(f'{glob.escape(self.file_path)}*.journal'))
+
     def load(self: Self, parent_msg: Message | None) -> None:
         with try_nest(parent_msg, self.file_path) as _:
-            self._data = load_file(self.file_path, {})
+            self.build, self._data, self._last_seen = read_cache_generations(self.file_path)
+            # journals left by failed or still-running builds. Entries saved by a build take precedence, so a build
+            # which failed because of a conflict doesn't make every later build fail too
+            saved_keys = set(self._data.keys())
+            saved_owners = {v: k for k, v in self._data.items()}
+            for path in self._journal_paths():
+                self._replayed[path] = os.path.getsize(path)
+                for k, v in read_journal(path):
+                    if k not in saved_keys and saved_owners.get(v, k) == k:
+                        self._data[k] = v
+            self._reverse = None
 
-    def save(self: Self, parent_msg: Message | None) -> None:
+    def save(self: Self, parent_msg: Message | None) -> bool:
+        """ Compacts the journal into the cache file as a new build, dropping entries which haven't been used in the last
+        `retention` builds. Returns whether the file was written, i.e. whether any entries changed. """
         with try_nest(parent_msg, self.file_path) as _:
-            write_file({k: v for k, v in self._data.items() if self._accessed[k]}, self.file_path)
\ No newline at end of file
+            with file_lock(self.lock_path):
+                self._merge()
+                self.build += 1
+                for k in self._data.keys():
+                    if self._accessed[k]:
+                        self._last_seen[k] = self.build
+                written = self._write()
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                for path in {self.journal_path, *self._replayed.keys()}:
+                    self._remove_journal(path)
+                self._replayed.clear()
+                self._assigned.clear()
+            return written
+
+    def _remove_journal(self: Self, path: str) -> None:
+        # other processes' journals are only removed if nothing was written to them since they were replayed
+        if not os.path.exists(path) or (path != self.journal_path and os.path.getsize(path) != self._replayed[path]):
+            return
+        try:
+            os.remove(path)
+        # on Windows, a journal which is still open in another process can't be removed
+        except OSError:
+            pass
+
+    def gc(self: Self, parent_msg: Message | None = None, retention: int | None = None) -> int:
+        """ Drops entries which haven't been used in the last `retention` builds (by default, this cache's retention)
+        without counting as a build. Returns how many entries were dropped. """
+        retention = retention if retention is not None else self.retention
+        with try_nest(parent_msg, f'Collecting garbage in {self.file_path}') as _:
+            with file_lock(self.lock_path):
+                self._merge()
+                count = len(self._data)
+                self._write(retention)
+                return count - len(self._data)
+
+    def _merge(self: Self) -> None:
+        """ Adds entries saved by other processes since this cache was loaded """
+        build, data, last_seen = read_cache_generations(self.file_path)
+        self.build = max(self.build, build)
+        for k, v in data.items():
+            if k not in self._data:
+                self._data[k] = v
+            elif self._data[k] != v:
+                if k in self._assigned:
+                    raise Exception(f'Cannot save {self.file_path}: another build set {k} to {v!r}, but this one set it to {self._data[k]!r}!')
+                self._data[k] = v
+            self._last_seen[k] = max(self._last_seen.get(k, last_seen[k]), last_seen[k])
+        owners = {v: k for k, v in data.items()}
+        for k in self._assigned:
+            owner = owners.get(self._data[k], k)
+            if owner != k:
+                raise Exception(f'Cannot save {self.file_path}: another build assigned {self._data[k]!r} to {owner}, but this one assigned it to {k}!')
+        self._reverse = None
+
+    def _write(self: Self, retention: int | None = None) -> bool:
+        retention = retention if retention is not None else self.retention
+        # entries replayed from a journal haven't been saved by any build yet, so they count as used by the last one
+        for k in [k for k in self._data.keys() if self.build - self._last_seen.get(k, self.build) >= retention]:
+            del self._data[k]
+            self._last_seen.pop(k, None)
+        self._reverse = None
+        return write_cache_file(self.file_path, self._data, self.build, self._last_seen)
@@ -1,29 +1,231 @@
-from typing import Self
+import gc
+import os
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from time import time_ns
+from typing import Iterable, Self
 
-from ndf_parse import Mod
+import ndf_parse
+from ndf_parse import Edit, Mod, printer
 from ndf_parse.model import List
 
+from warno_mfw.utils.io import stream_if_changed
+from warno_mfw.utils.types import message
 from warno_mfw.utils.types.message import Message, try_nest
 
 from .base import BaseCache
+from .snapshot import NdfSnapshotCache
+from .tracked_list import TrackedList
+
+def _parse(path: str, src_path: str, snapshots: NdfSnapshotCache | None) -> List:
+    with open(src_path, 'rb') as file:
+        data = file.read()
+    tree = ndf_parse.convert(data)
+    if snapshots is not None:
+        snapshots.write(path, data, tree)
+    return tree
+
+def _write_tree(tree: List, dst_path: str) -> bool:
+    # printer.format writes one root row at a time, so the file's text is never held in memory all at once
+    return stream_if_changed(dst_path, lambda file: printer.format(tree, file), 'utf-8')
+
+def _write_tree_timed(tree: List, dst_path: str) -> tuple[bool, int, int]:
+    start = time_ns()
+    written = _write_tree(tree, dst_path)
+    return (written, start, time_ns())
 
 class NdfCache(BaseCache[List]):
-    def __init__(self: Self, mod: Mod):
+    def __init__(self: Self, mod: Mod, snapshots: NdfSnapshotCache | None = None, memory_budget: int | None = None):
+        """ If `memory_budget` is set, trees which have only been read are dropped, least recently used first, once
+        their source files add up to more than that many bytes. A dropped tree which is still referenced elsewhere is
+        reused the next time it's accessed, and still counts towards the budget; otherwise it's loaded again, from its
+        snapshot if there is one. Trees which have been edited are kept until they're saved. """
         super().__init__()
         self._mod = mod
         self._data = {}
+        self.snapshots = snapshots
+        self.memory_budget = memory_budget
+        self._dirty: set[str] = set()
+        # read-only trees in least to most recently used order, with the size of their source files
+        self._evictable: OrderedDict[str, int] = OrderedDict()
+        self._evictable_size = 0
+        # dropped trees which may still be referenced elsewhere, and the size of those which are
+        self._evicted: weakref.WeakValueDictionary[str, List] = weakref.WeakValueDictionary()
+        self._evicted_sizes: dict[str, int] = {}
+        self._evicted_size = 0
+        self._finalizers: dict[str, weakref.finalize] = {}
 
     def __getitem__(self: Self, key: str) -> List:
-        if key not in self:
+        return self.edit(key)
+
+    def edit(self: Self, key: str, save: bool = True) -> List:
+        """ Gets the tree for `key`, loading it if necessary. The file is only written if it's changed, and like
+        Mod.edit(save=False), if `save` is False this edit is never written: the file is only written if it's also
+        accessed with `save` = True, in which case changes made through either reference are written, since they share
+        the same tree. """
+        if key not in self and not self._readopt(key):
             # TODO: with #30, message here
-            with try_nest(None, f'Loading ndf {key}') as _:
-                self._data[key] = self._mod.edit(key).current_tree
+            with try_nest(None, f'Loading ndf {key}') as msg:
+                self._load(key, msg)
+        tree: TrackedList = super().__getitem__(key)
+        if tree.read_only:
+            # the first edit of a file which has only been read so far
+            tree.read_only = False
+            self._mod.edits.append(Edit(tree, key, True))
+            self._evictable_size -= self._evictable.pop(key)
+        if save:
+            self._dirty.add(key)
+        return tree
+
+    def read(self: Self, key: str) -> List:
+        """ Gets the tree for `key` without registering an edit, so it won't be written unless it's edited later.
+        Until then, nothing in the tree can be changed, however deeply nested. """
+        if key not in self and not self._readopt(key):
+            with try_nest(None, f'Reading ndf {key}') as msg:
+                self._load(key, msg, read_only=True)
+        elif key in self._evictable:
+            self._evictable.move_to_end(key)
         return super().__getitem__(key)
 
+    @property
+    def modified(self: Self) -> list[str]:
+        """ Keys of the files save() writes unless their content is unchanged """
+        return sorted(edit.file_path for edit in self._mod.edits if self.is_dirty(edit.file_path))
+
+    def is_dirty(self: Self, key: str) -> bool:
+        # edits made directly through the Mod aren't tracked, so assume they're modified
+        if key not in self:
+            return True
+        return key in self._dirty and super().__getitem__(key).modified
+
+    def _src_path(self: Self, key: str) -> str:
+        return os.path.join(self._mod.mod_src, key)
+
+    def _load(self: Self, key: str, msg: Message, read_only: bool = False) -> List:
+        if self.snapshots is not None:
+            tree = self.snapshots.load(key, self._src_path(key), msg)
+        elif read_only:
+            tree = self._mod.parse_src(key)
+        else:
+            tree = self._mod.edit(key).current_tree
+            self._data[key] = TrackedList.track(tree)
+            return tree
+        return self._add(key, tree, read_only)
+
+    def _add(self: Self, key: str, tree: List, read_only: bool = False) -> List:
+        if not read_only:
+            self._mod.edits.append(Edit(tree, key, True))
+        self._data[key] = TrackedList.track(tree, read_only)
+        if read_only:
+            size = os.path.getsize(self._src_path(key))
+            self._evictable[key] = size
+            self._evictable_size += size
+            self._evict()
+        return tree
+
+    def _evict(self: Self) -> None:
+        if self.memory_budget is None:
+            return
+        # trees dropped here are assumed to be freed, which is checked once they've all been dropped
+        dropped = 0
+        # never drop the tree which was just loaded
+        while self._evictable_size + self._evicted_size - dropped > self.memory_budget and len(self._evictable) > 1:
+            key, size = self._evictable.popitem(last=False)
+            self._evictable_size -= size
+            tree = self._data.pop(key)
+            # the tree is only freed once nothing else references it, so it counts towards the budget until then
+            self._evicted[key] = tree
+            self._evicted_sizes[key] = size
+            self._evicted_size += size
+            self._finalizers[key] = weakref.finalize(tree, self._release, key)
+            tree = None
+            dropped += size
+        # rows reference their parent list, so unreferenced trees are only freed by the cycle collector. Collecting a
+        # large heap is slow, so it's done once for every tree dropped here
+        if dropped > 0:
+            gc.collect()
+
+    def _release(self: Self, key: str) -> None:
+        del self._finalizers[key]
+        self._evicted_size -= self._evicted_sizes.pop(key)
+
+    def _readopt(self: Self, key: str) -> bool:
+        """ Puts back a dropped tree which is still referenced, so every holder keeps sharing the same tree """
+        tree = self._evicted.pop(key, None)
+        if tree is None:
+            return False
+        self._finalizers.pop(key).detach()
+        size = self._evicted_sizes.pop(key)
+        self._evicted_size -= size
+        self._data[key] = tree
+        self._evictable[key] = size
+        self._evictable_size += size
+        return True
+
+    def prefetch(self: Self, keys: Iterable[str], parent_msg: Message | None = None, jobs: int | None = None) -> None:
+        """ Parses every file in `keys` which isn't loaded yet at the same time, using a pool of `jobs` processes.
+
+        Files with an up-to-date snapshot are loaded from it directly, since that's faster than sending the tree back from a worker.
+        Prefetched files are loaded as if by read(), so they aren't written unless they're edited. """
+        keys = sorted(set(key for key in keys if key not in self and key not in self._evicted))
+        if not any(keys):
+            return
+        with try_nest(parent_msg, f'Prefetching {len(keys)} ndf files') as msg:
+            if self.snapshots is not None:
+                for key in [key for key in keys if self.snapshots.has(key, self._src_path(key))]:
+                    self._load(key, msg, read_only=True)
+                    keys.remove(key)
+            if not any(keys):
+                return
+            with msg.nest(f'Parsing {len(keys)} files with {jobs or os.cpu_count()} processes') as msg2:
+                # a forked worker must not inherit the output lock while the flush timer holds it
+                message.output.flush()
+                with ProcessPoolExecutor(max_workers=jobs) as pool:
+                    futures = {key: pool.submit(_parse, key, self._src_path(key), self.snapshots) for key in keys}
+                    for key in keys:
+                        with msg2.nest(f'Loading {key}') as _:
+                            self._add(key, futures[key].result(), read_only=True)
+                        if self.snapshots is not None:
+                            self.snapshots.misses += 1
+
     def load(self: Self, _: Message | None = None) -> None:
         pass
 
-    def save(self: Self, parent_msg: str | None = None) -> None:
-        for edit in sorted(self._mod.edits, key=lambda x: x.file_path):
-            with try_nest(parent_msg, f"Writing {edit.file_path}") as _:
-                self._mod.write_edit(edit)
\ No newline at end of file
+    def save(self: Self, parent_msg: Message | None = None, jobs: int = 1) -> int:
+        """ Writes every modified file whose content changed, returning how many files were left as they were.
+        If `jobs` is greater than 1, files are written in parallel by a pool of that many processes. """
+        edits = sorted(self._mod.edits, key=lambda x: x.file_path)
+        modified = [edit for edit in edits if self.is_dirty(edit.file_path)]
+        if jobs > 1 and len(modified) > 1:
+            written = self._save_parallel(modified, parent_msg, jobs)
+        else:
+            written = 0
+            for edit in modified:
+                with try_nest(parent_msg, f"Writing {edit.file_path}") as _:
+                    written += _write_tree(edit.tree, self._dst_path(edit.file_path))
+        unmodified, unchanged = len(edits) - len(modified), len(modified) - written
+        if parent_msg is not None and (unmodified > 0 or unchanged > 0):
+            parent_msg.write_line(f'Skipped {unmodified} unmodified and {unchanged} unchanged files')
+        if self.snapshots is not None:
+            self.snapshots.evict(parent_msg)
+        return unmodified + unchanged
+
+    def _dst_path(self: Self, key: str) -> str:
+        return os.path.join(self._mod.mod_dst, key)
+
+    def _save_parallel(self: Self, edits: list[Edit], parent_msg: Message | None, jobs: int) -> int:
+        written = 0
+        with try_nest(parent_msg, f'Writing {len(edits)} files with {jobs} processes') as msg:
+            # a forked worker must not inherit the output lock while the flush timer holds it
+            message.output.flush()
+            # trees are pickled to the workers, so this also works where processes are spawned rather than forked.
+            # Each worker streams its file to disk, so no file's text is ever held in memory all at once
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = {edit.file_path: pool.submit(_write_tree_timed, edit.tree, self._dst_path(edit.file_path)) for edit in edits}
+                # results are reported in sorted order regardless of which finished first
+                for edit in edits:
+                    file_written, start, end = futures[edit.file_path].result()
+                    written += file_written
+                    msg.report(f"Writing {edit.file_path}", start, end)
+        return written
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import pickle
+from typing import Self
+
+import ndf_parse
+from ndf_parse.model import List
+
+from warno_mfw.utils.types.message import Message, try_nest
+
+from .file import DEFAULT_FOLDER
+
+DEFAULT_SNAPSHOT_FOLDER = os.path.join(DEFAULT_FOLDER, 'ndf')
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+EXTENSION = '.snapshot'
+
+def _digest(*parts: bytes) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part)
+        h.update(b'\0')
+    return h.hexdigest()
+
+class NdfSnapshotCache(object):
+    """ On-disk store of parsed ndf trees, keyed by file path, source hash and ndf_parse version """
+    def __init__(self: Self, folder: str = DEFAULT_SNAPSHOT_FOLDER, max_size: int = DEFAULT_MAX_SIZE):
+        self.folder = folder
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def _path_prefix(self: Self, path: str) -> str:
+        return _digest(os.path.normpath(path).lower().encode())[:16]
+
+    def snapshot_path(self: Self, path: str, data: bytes) -> str:
+        content = _digest(ndf_parse.__version__.encode(), data)[:32]
+        return os.path.join(self.folder, f'{self._path_prefix(path)}-{content}{EXTENSION}')
+
+    def load(self: Self, path: str, src_path: str, msg: Message | None = None) -> List:
+        with open(src_path, 'rb') as file:
+            data = file.read()
+        snapshot_path = self.snapshot_path(path, data)
+        if os.path.exists(snapshot_path):
+            try:
+                with try_nest(msg, f'Snapshot hit: {path}') as _:
+                    with open(snapshot_path, 'rb') as file:
+                        tree: List = pickle.load(file)
+                    # mtime doubles as the last-used time for LRU eviction
+                    os.utime(snapshot_path)
+                self.hits += 1
+                return tree
+            except Exception:
+                os.remove(snapshot_path)
+        with try_nest(msg, f'Snapshot miss: {path}') as _:
+            tree = ndf_parse.convert(data)
+            self.write(path, data, tree)
+        self.misses += 1
+        return tree
+
+    def has(self: Self, path: str, src_path: str) -> bool:
+        with open(src_path, 'rb') as file:
+            return os.path.exists(self.snapshot_path(path, file.read()))
+
+    def write(self: Self, path: str, data: bytes, tree: List) -> None:
+        """ Stores `tree` as the snapshot of `path` with source `data`, replacing any stale snapshots of that path """
+        snapshot_path = self.snapshot_path(path, data)
+        os.makedirs(self.folder, exist_ok=True)
+        prefix = self._path_prefix(path)
+        for name in os.listdir(self.folder):
+            if name.startswith(prefix):
+                os.remove(os.path.join(self.folder, name))
+        tmp_path = f'{snapshot_path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(tree, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+
+    def evict(self: Self, msg: Message | None = None) -> None:
+        """ Deletes the least recently used snapshots until the store fits in max_size bytes """
+        if not os.path.exists(self.folder):
+            return
+        with try_nest(msg, f'Pruning ndf snapshots ({self.hits} hits, {self.misses} misses)') as _:
+            entries: list[tuple[float, int, str]] = []
+            for name in os.listdir(self.folder):
+                if not name.endswith(EXTENSION):
+                    continue
+                stat = os.stat(os.path.join(self.folder, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_size:
+                    break
+                os.remove(os.path.join(self.folder, name))
+                total -= size
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+from typing import Iterator, Self, TypeVar
+
+from warno_mfw.utils.types.message import Message, try_nest
+
+from .base import BaseCache
+from .file import DEFAULT_FOLDER, DEFAULT_RETENTION, read_cache_generations
+
+V = TypeVar('V')
+DEFAULT_BATCH_SIZE = 256
+# seconds to wait for another process's uncommitted batch before giving up
+BUSY_TIMEOUT = 60
+
+class SqliteCache(BaseCache[V]):
+    """ Alternative to FileCache which stores entries in an SQLite database instead of rewriting a file on save.
+
+    Lookups go through the primary key index rather than loading everything into memory. Writes are committed every
+    `batch_size` changes and when a build fails, so only the last batch can be lost, and only if the process is killed.
+    Like FileCache, entries are kept until `retention` builds have been saved without using them. """
+    def __init__(self: Self,
+                 name: str,
+                 folder: str = DEFAULT_FOLDER,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 retention: int = DEFAULT_RETENTION):
+        self.file_path = os.path.join(folder, f'{name}.sqlite')
+        # the FileCache this replaces, which is imported the first time the database is created
+        self.legacy_path = os.path.join(folder, f'{name}.cache')
+        self.batch_size = batch_size
+        self.retention = retention
+        self.build = 0
+        self._connection: sqlite3.Connection | None = None
+        self._uncommitted = 0
+        self._changed = False
+        self._accessed: set[str] = set()
+
+    @property
+    def connection(self: Self) -> sqlite3.Connection:
+        if self._connection is None:
+            raise Exception(f'{self.file_path} must be loaded before it is used!')
+        return self._connection
+
+    def __getitem__(self: Self, key: str) -> V:
+        self._accessed.add(key)
+        row = self.connection.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    def __setitem__(self: Self, key: str, val: V):
+        self._accessed.add(key)
+        cursor = self.connection.execute('INSERT INTO entries (key, value, last_seen) VALUES (?, ?, ?) '
+                                         'ON CONFLICT (key) DO UPDATE SET value = excluded.value WHERE value IS NOT excluded.value',
+                                         (key, val, self.build))
+        if cursor.rowcount > 0:
+            self._changed = True
+            self._uncommitted += 1
+            if self._uncommitted >= self.batch_size:
+                self.commit()
+
+    def __contains__(self: Self, key: str) -> bool:
+        self._accessed.add(key)
+        return self.connection.execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is not None
+
+    def reverse_lookup(self: Self, val: V) -> str | None:
+        row = self.connection.execute('SELECT key FROM entries WHERE value = ? LIMIT 1', (val,)).fetchone()
+        return None if row is None else row[0]
+
+    def commit(self: Self) -> None:
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def load(self: Self, parent_msg: Message | None = None) -> None:
+        with try_nest(parent_msg, self.file_path) as _:
+            os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+            exists = os.path.exists(self.file_path)
+            # caches may be saved from a worker thread, though never from two threads at once
+            self._connection = sqlite3.connect(self.file_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode = WAL')
+            self._connection.execute('PRAGMA synchronous = NORMAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value, last_seen INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID')
+            if 'last_seen' not in (row[1] for row in self._connection.execute('PRAGMA table_info (entries)')):
+                self._connection.execute('ALTER TABLE entries ADD COLUMN last_seen INTEGER NOT NULL DEFAULT 0')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS entries_by_value ON entries (value)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value) WITHOUT ROWID')
+            if not exists:
+                build, data, last_seen = read_cache_generations(self.legacy_path)
+                self._connection.execute("INSERT INTO meta (name, value) VALUES ('build', ?)", (build,))
+                self._connection.executemany('INSERT INTO entries (key, value, last_seen) VALUES (?, ?, ?)',
+                                             ((k, v, last_seen.get(k, build)) for k, v in data.items()))
+            row = self._connection.execute("SELECT value FROM meta WHERE name = 'build'").fetchone()
+            self.build = 0 if row is None else row[0]
+            self.commit()
+
+    def save(self: Self, parent_msg: Message | None = None) -> bool:
+        """ Commits outstanding changes as a new build and drops entries which haven't been used in the last `retention`
+        builds. Returns whether any entries changed. """
+        with try_nest(parent_msg, self.file_path) as _:
+            connection = self.connection
+            self.build += 1
+            connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('build', ?)", (self.build,))
+            connection.execute('CREATE TEMP TABLE IF NOT EXISTS accessed (key TEXT PRIMARY KEY) WITHOUT ROWID')
+            connection.execute('DELETE FROM accessed')
+            connection.executemany('INSERT INTO accessed (key) VALUES (?)', ((key,) for key in self._accessed))
+            connection.execute('UPDATE entries SET last_seen = ? WHERE key IN (SELECT key FROM accessed)', (self.build,))
+            dropped = self._drop_unused(self.retention)
+            changed = self._changed or dropped > 0
+            self.commit()
+            connection.close()
+            self._connection = None
+            return changed
+
+    def gc(self: Self, parent_msg: Message | None = None, retention: int | None = None) -> int:
+        """ Drops entries which haven't been used in the last `retention` builds (by default, this cache's retention)
+        without counting as a build. Returns how many entries were dropped. """
+        with try_nest(parent_msg, f'Collecting garbage in {self.file_path}') as _:
+            dropped = self._drop_unused(retention if retention is not None else self.retention)
+            self.commit()
+            return dropped
+
+    def _drop_unused(self: Self, retention: int) -> int:
+        return self.connection.execute('DELETE FROM entries WHERE ? - last_seen >= ?', (self.build, retention)).rowcount
+
+    @property
+    def keys(self: Self) -> Iterator[str]:
+        for row in self.connection.execute('SELECT key FROM entries ORDER BY key'):
+            yield row[0]
+
+    @property
+    def values(self: Self) -> Iterator[V]:
+        for row in self.connection.execute('SELECT value FROM entries ORDER BY key'):
+            yield row[0]
+
+    @property
+    def items(self: Self) -> Iterator[tuple[str, V]]:
+        for row in self.connection.execute('SELECT key, value FROM entries ORDER BY key'):
+            yield (row[0], row[1])
+
+    @property
+    def any(self: Self) -> bool:
+        return self.connection.execute('SELECT EXISTS (SELECT 1 FROM entries)').fetchone()[0] == 1
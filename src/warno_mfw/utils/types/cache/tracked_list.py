@@ -0,0 +1,102 @@
+from typing import Any, Callable, Self
+
+from ndf_parse import printer
+from ndf_parse.model import List, ListRow
+from ndf_parse.model import abc
+
+
+class TrackedList(List):
+    """ Root list of a file loaded by NdfCache. Indexes rows by namespace so by_name is O(1), records whether anything
+    in the file has been changed, and refuses changes to files which have only been read. """
+    @classmethod
+    def track(cls, tree: List, read_only: bool = False) -> Self:
+        tree.__class__ = cls
+        tree._index = None
+        tree.read_only = read_only
+        tree.modified = False
+        return tree
+
+    def _modify(self: Self) -> None:
+        if getattr(self, 'read_only', False):
+            raise Exception("Cannot modify a file opened with NdfCache.read()! Use NdfCache.edit() instead.")
+        self.modified = True
+
+    @property
+    def rows_by_namespace(self: Self) -> dict[str, ListRow]:
+        # trees created by copy() or unpickling start without an index
+        if getattr(self, '_index', None) is None:
+            self._index = {}
+            for row in self:
+                if row.namespace is not None:
+                    self._index.setdefault(row.namespace, row)
+        return self._index
+
+    def by_namespace(self: Self, namespace: str, strict: bool = True) -> ListRow | None:
+        row = self.rows_by_namespace.get(namespace, None)
+        if row is not None and row.parent is self and row.namespace == namespace:
+            return row
+        # not indexed, removed or renamed since it was indexed: fall back to a scan
+        row = super().by_namespace(namespace, strict)
+        if row is not None:
+            self.rows_by_namespace[namespace] = row
+        return row
+
+    by_name = by_namespace
+    by_n = by_namespace
+
+    def add(self: Self, *args: Any, **kwargs: Any) -> ListRow | list[ListRow]:
+        result = super().add(*args, **kwargs)
+        for row in (result if isinstance(result, list) else [result]):
+            if row.namespace is not None:
+                self.rows_by_namespace.setdefault(row.namespace, row)
+        return result
+
+    def insert(self: Self, *args: Any, **kwargs: Any) -> ListRow | list[ListRow]:
+        # an inserted row may precede an existing row with the same namespace, so rebuild lazily
+        self._index = None
+        return super().insert(*args, **kwargs)
+
+    def replace(self: Self, *args: Any, **kwargs: Any) -> ListRow | list[ListRow]:
+        # the replaced rows may be indexed, and the new ones may precede rows with the same namespace
+        self._index = None
+        return super().replace(*args, **kwargs)
+
+    def __setitem__(self: Self, *args: Any) -> None:
+        self._index = None
+        super().__setitem__(*args)
+
+    def __delitem__(self: Self, key: Any) -> ListRow | list[ListRow]:
+        result = super().__delitem__(key)
+        for row in (result if isinstance(result, list) else [result]):
+            if self.rows_by_namespace.get(row.namespace, None) is row:
+                del self.rows_by_namespace[row.namespace]
+        return result
+
+    def __getstate__(self: Self) -> dict[str, Any]:
+        return {k: v for k, v in self.__dict__.items() if k not in ('_index', 'read_only', 'modified')}
+
+# ndf_parse looks up printers by exact type
+printer.NODE_PRINTERS[TrackedList] = printer.parse_list
+
+def _modified(node: abc.Row | abc.List | None) -> None:
+    """ Tells the root list `node` is in that it's about to change, if that's a TrackedList """
+    # rows are parented to lists and nested lists to rows, so this walks up to the root
+    while node is not None:
+        parent = getattr(node, '_parent', None)
+        if parent is None and isinstance(node, TrackedList):
+            node._modify()
+        node = parent
+
+def _hook(f: Callable[..., Any], changes: Callable[..., bool]) -> Callable[..., Any]:
+    def hooked(self: Any, *args: Any, **kwargs: Any) -> Any:
+        if changes(self, *args):
+            _modified(self)
+        return f(self, *args, **kwargs)
+    return hooked
+
+# ndf_parse has no change notifications, so every method which changes a row or list reports it to the root
+_LIST_ATTRIBUTES = ('type', 'is_root')
+abc.Row.__setattr__ = _hook(abc.Row.__setattr__, lambda row, name, *_: name in row._args_names_flat)
+abc.List.__setattr__ = _hook(abc.List.__setattr__, lambda _, name, *__: name in _LIST_ATTRIBUTES)
+for _name in ['add', 'insert', 'replace', '__setitem__', '__delitem__']:
+    setattr(abc.List, _name, _hook(getattr(abc.List, _name), lambda *_: True))
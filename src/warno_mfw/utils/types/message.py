@@ -1,23 +1,102 @@
-from typing import Self
+import atexit
+import json
+import os
+import sys
+import threading
+from enum import IntEnum
+from typing import Any, Iterator, Self
 from time import time_ns
 
 PADDING = 128
+# how many steps nested in the same message are printed before the rest are only counted, unless debugging
+COLLAPSE_AFTER = 20
+# output is written once this many characters are buffered, or this many seconds after the first was
+CHUNK_SIZE = 64 * 1024
+FLUSH_INTERVAL = 0.1
+
+class Verbosity(IntEnum):
+    """ How much Message prints. Every step is timed and recorded regardless. """
+    # only top-level messages and the steps directly nested in them
+    SUMMARY = 0
+    # every step, except that steps after the first COLLAPSE_AFTER in the same message are summarized in one line
+    NORMAL = 1
+    # every step
+    DEBUG = 2
+
+verbosity = Verbosity.NORMAL
+
+def set_verbosity(level: Verbosity) -> None:
+    """ Sets how much messages created from now on print """
+    global verbosity
+    verbosity = level
+
+class BufferedOutput(object):
+    """ Writes text to stdout in chunks rather than flushing every message, so printing many steps doesn't slow down
+    the steps themselves. Text is never held for longer than `interval` seconds. """
+    def __init__(self: Self, chunk_size: int = CHUNK_SIZE, interval: float = FLUSH_INTERVAL):
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self._buffer: list[str] = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+
+    def write(self: Self, text: str) -> None:
+        with self._lock:
+            self._buffer.append(text)
+            self._size += len(text)
+            if self._size < self.chunk_size:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self: Self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._buffer:
+                return
+            sys.stdout.write(''.join(self._buffer))
+            sys.stdout.flush()
+            self._buffer.clear()
+            self._size = 0
+
+output = BufferedOutput()
+atexit.register(output.flush)
 
 def _fmt(start: int, end: int) -> str:
     return f'{(end - start) / 1e9:.3f}s'.rjust(9)
 
 class Message(object):
-    """ Wrapper for the {msg}...Done! pattern in a readable way """
+    """ Wrapper for the {msg}...Done! pattern in a readable way.
+
+    Nested messages are recorded as a tree of timed spans, which can be exported once the build is done with
+    `export_json` or `export_chrome_trace`. How many of them are printed depends on the `Verbosity`. """
     def __init__(self: Self, msg: str, indent: int = 0, force_nested = False):
         self.indent = indent
+        self.name = msg
         self.msg = msg.replace('\n', f'\n{self.indent_str}')
         self.has_nested = force_nested
         self.has_failed = False
+        self.parent: Message | None = None
+        self.children: list[Message] = []
+        self.start_time: int | None = None
+        self.end_time: int | None = None
+        self.failure: str | None = None
+        # whether this step was timed elsewhere, so it may overlap its siblings
+        self.reported = False
+        self.visible = True
+        # nested steps which were counted instead of printed
+        self.collapsed: list[Message] = []
     
     def __enter__(self: Self):
         self.printed_msg = f'{self.indent_str}{self.msg}...'
         end = '\n' if self.has_nested else ''
-        print(self.printed_msg, end=end, flush=True)
+        self._write(f'{self.printed_msg}{end}')
         self.start_time = time_ns()
         return self
     
@@ -25,30 +104,162 @@ class Message(object):
         if self.has_failed:
             return
         success = not (exc_type is not None or exc_value is not None or traceback is not None)
+        if not success:
+            self.failure = f'{exc_type} {exc_value}'
         self._print_report("Done!" if success else f"Failed: {exc_type} {exc_value}")
-        
+        if self.parent is None:
+            output.flush()
 
     def fail(self: Self, msg) -> None:
+        self.failure = str(msg)
         self._print_report(f'Failed: {msg}')
         self.has_failed = True
         self.__exit__()
 
-    def _print_report(self: Self, report: str):
+    def _print_report(self: Self, report: str, end_time: int | None = None):
+        self.end_time = end_time or time_ns()
+        if any(self.collapsed):
+            total = sum((child.end_time or self.end_time) - child.start_time for child in self.collapsed if child.start_time is not None)
+            failed = sum(child.failure is not None for child in self.collapsed)
+            result = 'Done!' if failed == 0 else f'Failed: {failed} of {len(self.collapsed)}'
+            summary = f'{self.indent_str}  ...and {len(self.collapsed)} more'
+            self._write(f'{summary}{"".ljust(max(PADDING - len(summary), 0), ".")}{result} {_fmt(0, total)}\n')
         indents_or_periods = self.indent_str if self.has_nested else "".ljust(max(PADDING - len(self.printed_msg), 0), ".")
-        print(f'{indents_or_periods}{report} {_fmt(self.start_time, time_ns())}')
+        self._write(f'{indents_or_periods}{report} {_fmt(self.start_time, self.end_time)}\n')
+
+    def _write(self: Self, text: str) -> None:
+        if self.visible:
+            output.write(text)
+
+    def write_line(self: Self, text: str) -> None:
+        """ Prints a line under this message, e.g. output from a script it ran """
+        if self.visible and not self.has_nested:
+            self._write('\n')
+            self.has_nested = True
+        self._write(f'{self.indent_str}  {text}\n')
     
     @property
     def indent_str(self: Self) -> str:
         return '  ' * self.indent
 
+    def report(self: Self, msg: str, start_time: int, end_time: int) -> None:
+        """ Prints a nested message for a step which was timed elsewhere, e.g. in another process """
+        child = self.nest(msg)
+        child.printed_msg = f'{child.indent_str}{child.msg}...'
+        child.start_time = start_time
+        child.reported = True
+        child._write(child.printed_msg)
+        child._print_report("Done!", end_time)
+
     def nest(self: Self, msg: str, *args, **kwargs) -> Self:
-        if not self.has_nested:
-            print()
+        child = Message(msg, self.indent + 1, *args, *kwargs)
+        self._attach(child)
+        return child
+
+    def adopt(self: Self, child: Self) -> None:
+        """ Nests a message which was timed without being printed, e.g. because it ran alongside other messages, then
+        prints it and the steps nested in it """
+        self._attach(child)
+        # it ran alongside its new siblings, so it's traced like a step timed elsewhere
+        child.reported = True
+        child._replay()
+
+    def _attach(self: Self, child: Self) -> None:
+        child.parent = self
+        child.visible = self._shows_next_child()
+        if not child.visible and self.visible and verbosity == Verbosity.NORMAL:
+            self.collapsed.append(child)
+        self.children.append(child)
+        if child.visible and not self.has_nested:
+            self._write('\n')
             self.has_nested = True
-        return Message(msg, self.indent + 1, *args, *kwargs)
+
+    def _replay(self: Self) -> None:
+        children = [child for child in self.children if child.start_time is not None]
+        self.children, self.collapsed, self.has_nested = [], [], False
+        self.printed_msg = f'{self.indent_str}{self.msg}...'
+        self._write(self.printed_msg)
+        for child in children:
+            self._attach(child)
+            child._replay()
+        self._print_report("Done!" if self.failure is None else f"Failed: {self.failure}", self.end_time)
+
+    def _shows_next_child(self: Self) -> bool:
+        if not self.visible:
+            return False
+        match verbosity:
+            case Verbosity.SUMMARY:
+                return self.parent is None
+            case Verbosity.NORMAL:
+                return len(self.children) < COLLAPSE_AFTER
+        return True
+
+    def spans(self: Self, depth: int = 0) -> Iterator[tuple[Self, int]]:
+        """ Yields this message and every message nested in it which has started, with their depth below this one """
+        if self.start_time is None:
+            return
+        yield (self, depth)
+        for child in self.children:
+            yield from child.spans(depth + 1)
+
+    def to_dict(self: Self, depth: int = 0, now: int | None = None) -> dict[str, Any]:
+        """ The tree of spans under this message. Times are nanoseconds since the epoch; steps which haven't finished
+        end `now`, i.e. when this is called. """
+        now = now or time_ns()
+        return {
+            'name': self.name,
+            'start': self.start_time,
+            'end': self.end_time or now,
+            'depth': depth,
+            'failure': self.failure,
+            'children': [child.to_dict(depth + 1, now) for child in self.children if child.start_time is not None]
+        }
+
+    def to_chrome_trace(self: Self, now: int | None = None) -> dict[str, Any]:
+        """ The spans under this message as trace events, which chrome://tracing and Perfetto can open """
+        now = now or time_ns()
+        pid = os.getpid()
+        events: list[dict[str, Any]] = []
+        # reported steps may overlap each other, so they're spread over as many threads as needed to nest properly.
+        # Steps nested in them are on the same thread
+        lanes: list[int] = []
+        tids: dict[int, int] = {}
+        for message, _ in self.spans():
+            end = message.end_time or now
+            tid = tids.get(id(message.parent), 0)
+            if message.reported:
+                lane = next((i for i, lane_end in enumerate(lanes) if lane_end <= message.start_time), len(lanes))
+                if lane == len(lanes):
+                    lanes.append(end)
+                lanes[lane] = end
+                tid = lane + 1
+            tids[id(message)] = tid
+            event = {
+                'name': message.name,
+                'ph': 'X',
+                'ts': message.start_time / 1000,
+                'dur': (end - message.start_time) / 1000,
+                'pid': pid,
+                'tid': tid
+            }
+            if message.failure is not None:
+                event['args'] = {'failure': message.failure}
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_json(self: Self, path: str) -> None:
+        _write_json(path, self.to_dict())
+
+    def export_chrome_trace(self: Self, path: str) -> None:
+        _write_json(path, self.to_chrome_trace())
+
+def _write_json(path: str, obj: Any) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(obj, file, ensure_ascii=False)
     
 def try_nest(parent: Message | None, msg: str, *args, **kwargs) -> Message:
     if parent is None:
         return Message(msg, *args, **kwargs)
     else:
-        return parent.nest(msg, *args, **kwargs)
\ No newline at end of file
+        return parent.nest(msg, *args, **kwargs)
@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import unittest
+
+from warno_mfw.utils.types.cache.file import FileCache, read_cache_generations
+
+class TestFileCacheBuilds(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'test.cache')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def build(self, assign: dict[str, str] = {}, use: list[str] = []) -> bool:
+        """ Sets the entries in `assign` and looks up the keys in `use`, returning whether saving wrote the cache file """
+        cache = FileCache('test', self.folder.name, retention=2)
+        cache.load(None)
+        for k, v in assign.items():
+            cache[k] = v
+        for k in use:
+            cache[k]
+        return cache.save(None)
+
+    def test_unchanged_save_is_skipped(self):
+        self.assertTrue(self.build({'A': '1'}))
+        with open(self.path, 'rb') as file:
+            before = file.read()
+        self.assertFalse(self.build(use=['A']))
+        with open(self.path, 'rb') as file:
+            self.assertEqual(file.read(), before)
+
+    def test_builds_are_counted(self):
+        self.build({'A': '1', 'B': '2'})
+        self.assertFalse(self.build(use=['B']))
+        # A was last used two builds ago, so it's dropped
+        self.assertTrue(self.build(use=['B']))
+        build, data, last_seen = read_cache_generations(self.path)
+        self.assertEqual((build, data, last_seen), (3, {'B': '2'}, {'B': 3}))
+
+    def test_reads_version_2(self):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(f'{json.dumps({"format": "warno_mfw.FileCache", "version": 2, "build": 5})}\n')
+            file.write(f'{json.dumps(["A", "1", 4])}\n')
+            file.write(f'{json.dumps(["B", "2"])}\n')
+        self.assertEqual(read_cache_generations(self.path), (5, {'A': '1', 'B': '2'}, {'A': 4, 'B': 5}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import tempfile
+import unittest
+
+from warno_mfw.managers.localization import LocalizationManager
+from warno_mfw.utils.types.cache.file import FileCache
+from warno_mfw.utils.types.cache.sqlite import SqliteCache
+
+class TestLocalizationRetention(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def build(self, cache_type: type, *strings: str) -> list[str]:
+        """ Registers `strings`, generates the localization file and saves the cache, returning the cached strings """
+        cache = cache_type('localization', self.folder.name, retention=2)
+        cache.load(None)
+        manager = LocalizationManager(cache, 'TEST')
+        for string in strings:
+            manager.register(string)
+        manager.generate_csv(None)
+        result = list(cache.keys)
+        cache.save(None)
+        return result
+
+    def assert_unregistered_strings_dropped(self, cache_type: type):
+        self.build(cache_type, 'Old', 'New')
+        for _ in range(4):
+            self.build(cache_type, 'New')
+        self.assertEqual(self.build(cache_type), ['New'])
+
+    def test_file_cache(self):
+        self.assert_unregistered_strings_dropped(FileCache)
+
+    def test_sqlite_cache(self):
+        self.assert_unregistered_strings_dropped(SqliteCache)
+
+if __name__ == '__main__':
+    unittest.main()
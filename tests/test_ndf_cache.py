@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+# the parser needs ndf_parse's compiled grammar, which is only distributed for Windows
+try:
+    import ndf_parse
+    from ndf_parse import Mod
+    ndf_parse.convert('A is 1')
+except Exception as e:
+    raise unittest.SkipTest(f'ndf_parse could not parse: {e}')
+
+from warno_mfw.utils.types.cache.ndf import NdfCache
+
+KEY = 'GameData/Test.ndf'
+
+class TestNdfCacheEdit(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.folder.name, 'src')
+        self.dst = os.path.join(self.folder.name, 'dst')
+        os.makedirs(os.path.join(self.src, 'GameData'))
+        with open(os.path.join(self.src, KEY), 'w') as file:
+            file.write('A is 1\nB is 2\n')
+        # ModCreationContext syncs the destination from the source before editing
+        shutil.copytree(self.src, self.dst)
+        self.ndf = NdfCache(Mod(self.src, self.dst))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def written(self) -> str:
+        self.ndf.save(None)
+        with open(os.path.join(self.dst, KEY)) as file:
+            return file.read()
+
+    def test_edit_is_written(self):
+        self.ndf.edit(KEY).by_name('A').value = '3'
+        self.assertIn('3', self.written())
+
+    def test_lookup_is_not_modified(self):
+        self.ndf.edit(KEY).by_name('A')
+        self.assertFalse(self.ndf.is_dirty(KEY))
+
+    def test_nested_change_is_modified(self):
+        self.ndf.edit(KEY).by_name('A').namespace = 'C'
+        self.assertTrue(self.ndf.is_dirty(KEY))
+
+    def test_edit_without_save_is_not_written(self):
+        tree = self.ndf.edit(KEY, save=False)
+        tree.by_name('A').value = '3'
+        tree.add('C is 4')
+        self.assertEqual(self.written(), 'A is 1\nB is 2\n')
+
+    def test_nested_edit_writes_changes_made_without_save(self):
+        outer = self.ndf.edit(KEY, save=False)
+        inner = self.ndf.edit(KEY)
+        self.assertIs(inner, outer)
+        # only the reference taken without save is changed
+        outer.by_name('A').value = '3'
+        self.assertIn('3', self.written())
+
+if __name__ == '__main__':
+    unittest.main()
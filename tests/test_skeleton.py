@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from warno_mfw.metadata.warno import WarnoMetadata
+from warno_mfw.utils import bat
+from warno_mfw.utils.skeleton import SkeletonStore
+
+MOD_NAME = 'TestMod'
+
+class TestSkeletonStore(unittest.TestCase):
+    """ Stands in for CreateNewMod.bat with a fixture folder, so this runs without the game installed """
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        # sync_folder keeps its manifests in the working directory
+        self.cwd = os.getcwd()
+        os.chdir(self.folder.name)
+        self.fixture = os.path.join(self.folder.name, 'fixture')
+        os.makedirs(os.path.join(self.fixture, 'GameData'))
+        self.write(os.path.join(self.fixture, 'GameData', 'Test.ndf'), 'A is 1\n')
+        self.mods_path = os.path.join(self.folder.name, 'WARNO', 'Mods')
+        os.makedirs(self.mods_path)
+        self.mod_path = os.path.join(self.mods_path, MOD_NAME)
+        self.created = 0
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.folder.cleanup()
+
+    def write(self, path: str, text: str) -> None:
+        with open(path, 'w') as file:
+            file.write(text)
+
+    def read(self, path: str) -> str:
+        with open(path) as file:
+            return file.read()
+
+    def create(self, mod_path: str, mod_name: str, _) -> None:
+        self.created += 1
+        shutil.rmtree(mod_path, ignore_errors=True)
+        shutil.copytree(self.fixture, mod_path)
+
+    def store(self, build: str = 'build') -> SkeletonStore:
+        return SkeletonStore(WarnoMetadata(os.path.dirname(self.mods_path)),
+                             os.path.join(self.folder.name, 'skeletons'),
+                             build,
+                             self.create)
+
+    def test_created_once(self):
+        bat.reset_source(self.mod_path, MOD_NAME, self.mods_path, skeletons=self.store())
+        bat.reset_source(self.mod_path, MOD_NAME, self.mods_path, skeletons=self.store())
+        self.assertEqual(self.created, 1)
+        self.assertEqual(self.read(os.path.join(self.mod_path, 'GameData', 'Test.ndf')), 'A is 1\n')
+
+    def test_reset_restores_mod(self):
+        bat.reset_source(self.mod_path, MOD_NAME, self.mods_path, skeletons=self.store())
+        self.write(os.path.join(self.mod_path, 'GameData', 'Test.ndf'), 'A is 2\n')
+        self.write(os.path.join(self.mod_path, 'GameData', 'Extra.ndf'), 'B is 1\n')
+        bat.reset_source(self.mod_path, MOD_NAME, self.mods_path, skeletons=self.store())
+        self.assertEqual(self.read(os.path.join(self.mod_path, 'GameData', 'Test.ndf')), 'A is 1\n')
+        self.assertFalse(os.path.exists(os.path.join(self.mod_path, 'GameData', 'Extra.ndf')))
+
+    def test_writing_mod_keeps_skeleton(self):
+        store = self.store()
+        bat.reset_source(self.mod_path, MOD_NAME, self.mods_path, skeletons=store)
+        # written in place, as Mod.write_edit does
+        self.write(os.path.join(self.mod_path, 'GameData', 'Test.ndf'), 'A is 2\n')
+        self.assertEqual(self.read(os.path.join(store.path(MOD_NAME), 'GameData', 'Test.ndf')), 'A is 1\n')
+
+    def test_new_build(self):
+        bat.reset_source(self.mod_path, MOD_NAME, self.mods_path, skeletons=self.store('old'))
+        bat.reset_source(self.mod_path, MOD_NAME, self.mods_path, skeletons=self.store('new'))
+        self.assertEqual(self.created, 2)
+        self.assertEqual(os.listdir(os.path.join(self.folder.name, 'skeletons')), ['new'])
+
+if __name__ == '__main__':
+    unittest.main()
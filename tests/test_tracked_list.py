@@ -0,0 +1,131 @@
+import unittest
+
+from ndf_parse.model import List, ListRow, MemberRow, Object
+
+from warno_mfw.utils.types.cache.tracked_list import TrackedList
+
+
+def _scan(tree: List, namespace: str) -> ListRow | None:
+    for row in tree:
+        if row.namespace == namespace:
+            return row
+    return None
+
+class TestTrackedListIndex(unittest.TestCase):
+    NAMESPACES = ['A', 'B', 'C', 'D']
+
+    def setUp(self):
+        self.tree = TrackedList.track(List(is_root=True))
+        for namespace in ['A', 'B', 'C']:
+            self.tree.add(ListRow(value=f'{namespace}1', namespace=namespace))
+        # populate the index before mutating
+        self.assert_index_matches_scan()
+
+    def assert_index_matches_scan(self):
+        for namespace in self.NAMESPACES:
+            self.assertIs(self.tree.by_namespace(namespace, strict=False), _scan(self.tree, namespace), namespace)
+
+    def test_add(self):
+        self.tree.add(ListRow(value='D1', namespace='D'))
+        self.assert_index_matches_scan()
+
+    def test_add_duplicate(self):
+        self.tree.add(ListRow(value='A2', namespace='A'))
+        self.assert_index_matches_scan()
+
+    def test_insert_duplicate(self):
+        self.tree.insert(0, ListRow(value='C2', namespace='C'))
+        self.assert_index_matches_scan()
+
+    def test_replace(self):
+        self.tree.replace(1, ListRow(value='D1', namespace='D'))
+        self.assert_index_matches_scan()
+
+    def test_replace_with_duplicate(self):
+        self.tree.replace(0, ListRow(value='C2', namespace='C'))
+        self.assert_index_matches_scan()
+
+    def test_setitem(self):
+        self.tree[1] = ListRow(value='D1', namespace='D')
+        self.assert_index_matches_scan()
+
+    def test_setitem_with_duplicate(self):
+        self.tree[0] = ListRow(value='C2', namespace='C')
+        self.assert_index_matches_scan()
+
+    def test_delitem(self):
+        del self.tree[1]
+        self.assert_index_matches_scan()
+
+    def test_delitem_duplicate(self):
+        self.tree.add(ListRow(value='A2', namespace='A'))
+        del self.tree[0]
+        self.assert_index_matches_scan()
+
+    def test_remove(self):
+        self.tree.remove(0)
+        self.assert_index_matches_scan()
+
+class TestTrackedListModified(unittest.TestCase):
+    def setUp(self):
+        obj = Object(type='TDescriptor')
+        obj.add(MemberRow(member='Modules', value=List()))
+        tree = List(is_root=True)
+        tree.add(ListRow(value=obj, namespace='A'))
+        self.tree = TrackedList.track(tree)
+
+    def modules(self) -> List:
+        return self.tree.by_name('A').value.by_member('Modules').value
+
+    def test_lookup(self):
+        self.modules()
+        self.assertFalse(self.tree.modified)
+
+    def test_nested_add(self):
+        self.modules().add(ListRow(value='Module'))
+        self.assertTrue(self.tree.modified)
+
+    def test_nested_value(self):
+        self.tree.by_name('A').value.by_member('Modules').value = List()
+        self.assertTrue(self.tree.modified)
+
+    def test_object_type(self):
+        self.tree.by_name('A').value.type = 'TOtherDescriptor'
+        self.assertTrue(self.tree.modified)
+
+    def test_removed_row(self):
+        row = self.tree.by_name('A')
+        self.tree.remove(0)
+        self.tree.modified = False
+        row.value = 'B'
+        self.assertFalse(self.tree.modified)
+
+class TestTrackedListReadOnly(unittest.TestCase):
+    def setUp(self):
+        obj = Object(type='TDescriptor')
+        obj.add(MemberRow(member='Modules', value=List()))
+        tree = List(is_root=True)
+        tree.add(ListRow(value=obj, namespace='A'))
+        self.tree = TrackedList.track(tree, read_only=True)
+
+    def test_lookup(self):
+        self.tree.by_name('A').value.by_member('Modules')
+
+    def test_row_value(self):
+        with self.assertRaises(Exception):
+            self.tree.by_name('A').value = 'B'
+
+    def test_nested_member(self):
+        with self.assertRaises(Exception):
+            self.tree.by_name('A').value.by_member('Modules').value = List()
+
+    def test_nested_add(self):
+        with self.assertRaises(Exception):
+            self.tree.by_name('A').value.by_member('Modules').value.add(ListRow(value='Module'))
+
+    def test_copy(self):
+        row = self.tree.by_name('A').copy()
+        row.value.by_member('Modules').value.add(ListRow(value='Module'))
+
+if __name__ == '__main__':
+    unittest.main()